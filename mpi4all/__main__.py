@@ -3,10 +3,16 @@ import os.path
 import logging
 import sys
 import json
+import re
+import subprocess
+import threading
+from typing import List, Dict, Optional, Union
 
-from mpi4all.parser import Parser
-from mpi4all.generator.go import GoGenerator
-from mpi4all.generator.java import JavaGenerator
+from mpi4all.cache import ProbeCache
+from mpi4all.parser import Parser, parse_all
+from mpi4all.clang_ast import ClangParser
+from mpi4all.blueprint import load_blueprint, save_blueprint, dump_blueprint, select_blueprint
+from mpi4all.targets import parse_target, build_targets
 from mpi4all.version import __version__
 
 
@@ -18,23 +24,55 @@ def parse_args():
                      help='Place output in folder, by default is working directory', default=os.getcwd())
     cli.add_argument('--log', dest='log', action='store', metavar='lvl', choices=['info', 'warn', 'error'],
                      default='error', help='Log level, default error')
+    cli.add_argument('--target', dest='targets', action='append', metavar='spec', default=[],
+                     help='Add a generator target as kind[:option=value,...], kind is go, java or jdk21 and '
+                          'options are the Go or Java generator arguments without prefix, like '
+                          'go:package=mpi,out=build or java:class=Mpi,lib-name=mpi4all. Several targets are '
+                          'generated concurrently. Can be repeated')
+    cli.add_argument('--changed', dest='changed', action='store', metavar='path', default=None,
+                     help='Save the list of generated files whose content changed, one per line, - for stdout. '
+                          'Files with the same content are never rewritten')
 
     parser = cli.add_argument_group('Parser Arguments')
-    parser.add_argument('--cc', dest='cc', action='store', metavar='path',
-                        help='MPI C compiler, by default search in PATH')
-    parser.add_argument('--cxx', dest='cxx', action='store', metavar='path', default=None,
+    parser.add_argument('--cc', dest='cc', action='append', metavar='path', default=[],
+                        help='MPI C compiler, by default search in PATH. Repeat it the same number of times as --cxx '
+                             'to parse several MPI installations concurrently')
+    parser.add_argument('--cxx', dest='cxx', action='append', metavar='path', default=[],
                         help='MPI C++ compiler, by default search in PATH')
+    parser.add_argument('--manifest', dest='manifest', action='store', metavar='path', default=None,
+                        help='Parse concurrently the MPI installations of a json file, a list of objects with cc, '
+                             'cxx and dump keys. Probe results are shared between installations and --dump is used '
+                             'when dump is missing')
     parser.add_argument('--exclude', dest='exclude', action='store', metavar='str', nargs='+', default=[],
                         help='Exclude functions and macros that match with any pattern')
+    parser.add_argument('--include', dest='include', action='store', metavar='str', nargs='+', default=[],
+                        help='Only parse functions and macros that match with any pattern, macros used as values '
+                             'of the selected function types are also included')
+    parser.add_argument('--include-file', dest='include_file', action='store', metavar='path', default=None,
+                        help='Like --include but reading exact names from a file, one per line')
+    parser.add_argument('--engine', dest='engine', action='store', choices=['probe', 'clang-ast'], default='probe',
+                        help='Parser engine, probe compiles and runs test programs and clang-ast reads the clang AST '
+                             'without running anything, it requires clang as --cc and --cxx, default probe')
+    parser.add_argument('--jobs', '-j', dest='jobs', action='store', metavar='n', type=int, default=None,
+                        help='Maximum number of concurrent compiler or generator processes, '
+                             'by default the number of CPUs')
     parser.add_argument('--enable-fortran', dest='fortran', action='store_true', default=False,
                         help='Parse MPI Fortran functions, which are disabled by default, to avoid linking errors '
                              'if they are not available')
     parser.add_argument('--dump', dest='dump', action='store', metavar='path', default=None,
-                        help='Save blueprint as json file, - for stdout')
+                        help='Save blueprint as json file, or as compact binary file if the name ends with .m4a, '
+                             '- for stdout. With several MPI installations the name can use {index}, {vendor}, '
+                             '{version}, {system} and {arch}')
     parser.add_argument('--load', dest='load', action='store', metavar='path', default=None,
-                        help='Disable parser and load a blueprint, - for stdin')
+                        help='Disable parser and load a json or binary blueprint, - for stdin. With --include or '
+                             '--include-file only the selected functions and macros are loaded')
     parser.add_argument('--cache', dest='cache', action='store', metavar='path', default=None,
-                        help='Make --dump if the blueprint does not exist and --load otherwise')
+                        help='Make --dump if the blueprint does not exist or does not match the MPI toolchain '
+                             'and --load otherwise')
+    parser.add_argument('--probe-cache', dest='probe_cache', action='store', metavar='path', default=None,
+                        help='Keep compiler probe results in a folder to reuse them in later parses')
+    parser.add_argument('--profile', dest='profile', action='store', metavar='path', default=None,
+                        help='Save a json report with the parser phase timings and compiler calls, - for stderr')
 
     go_gen = cli.add_argument_group('Go Generator Arguments')
     go_gen.add_argument('--go', dest='go', action='store_true',
@@ -45,6 +83,18 @@ def parse_args():
                         help='Go package name, default mpi')
     go_gen.add_argument('--go-out', dest='go_out', action='store', metavar='name', default=None,
                         help='Go output directory, by default <out>')
+    go_gen.add_argument('--go-version', dest='go_version', action='store', metavar='version', default='1.18',
+                        help='Minimum Go version of the bindings, 1.20+ adds zero-copy string helpers, 1.21+ buffer '
+                             'pinning and 1.24+ cgo noescape and nocallback annotations, default 1.18')
+    go_gen.add_argument('--go-batch', dest='go_batch', action='store_true',
+                        help='Add a Batch type to run many point-to-point and completion calls in a single cgo call, '
+                             'with Go 1.21+ pointer arguments are pinned until Reset, otherwise they must be C memory')
+    go_gen.add_argument('--go-progress', dest='go_progress', action='store_true',
+                        help='Add a Progress type that completes requests with MPI_Testsome in a dedicated thread, '
+                             'it requires MPI_THREAD_MULTIPLE')
+    go_gen.add_argument('--go-usage', dest='go_usage', action='store', metavar='path', default=None,
+                        help='Only generate the functions and macros, with the types they need, referenced by the Go '
+                             'sources in path')
 
     java_gen = cli.add_argument_group('Java Generator Arguments')
     java_gen.add_argument('--java', dest='java', action='store_true',
@@ -71,6 +121,47 @@ def parse_args():
     return args
 
 
+def new_parser(args, cc: Optional[str], cxx: Optional[str], cache: Union[str, ProbeCache, None] = None,
+               limit: Optional[threading.Semaphore] = None) -> Parser:
+    return (ClangParser if args.engine == 'clang-ast' else Parser)(
+        cc=cc,
+        cxx=cxx,
+        exclude_list=args.exclude,
+        include_list=args.include,
+        cache=cache if cache is not None else args.probe_cache,
+        jobs=args.jobs,
+        limit=limit,
+    )
+
+
+def parse_installations(args, installations: List[Dict[str, str]]):
+    if args.load or args.cache or args.go or args.java or args.targets:
+        raise ValueError('--load, --cache, --go, --java and --target need a single MPI installation')
+    dumps = [installation.get('dump', args.dump) for installation in installations]
+    for dump in dumps:
+        if not dump or dump == '-' or ('{' not in dump and dumps.count(dump) > 1):
+            raise ValueError('each MPI installation needs its own dump file')
+
+    jobs = args.jobs if args.jobs else os.cpu_count() or 1
+    cache = ProbeCache(args.probe_cache)
+    limit = threading.Semaphore(jobs)
+    parsers = [new_parser(args, installation.get('cc'), installation.get('cxx'), cache, limit)
+               for installation in installations]
+    blueprints = parse_all(parsers)
+
+    for i, (dump, mpi_info) in enumerate(zip(dumps, blueprints)):
+        dump = dump.format(index=i, **mpi_info['info'])
+        logging.info(f'Saving {mpi_info["info"]["fingerprint"]["cc"]} blueprint as {dump}')
+        save_blueprint(mpi_info, dump)
+
+    if args.profile:
+        if args.profile == '-':
+            json.dump([parser.profile() for parser in parsers], sys.stderr, indent=4)
+        else:
+            with open(args.profile, mode='w') as file:
+                json.dump([parser.profile() for parser in parsers], file, indent=4)
+
+
 def main():
     args = parse_args()
     try:
@@ -81,53 +172,97 @@ def main():
         if not args.fortran:
             args.exclude.extend(['_(c2)?f[0-9cf]*$', '_DEFINED', '_INCLUDED'])
 
+        if args.include_file:
+            with open(args.include_file) as file:
+                for line in file:
+                    name = line.split('#', 1)[0].strip()
+                    if name:
+                        args.include.append('^' + re.escape(name) + '$')
+
+        installations = list()
+        if args.manifest:
+            with open(args.manifest) as file:
+                installations.extend(json.load(file))
+        if args.manifest or len(args.cc) > 1 or len(args.cxx) > 1:
+            if len(args.cc) != len(args.cxx):
+                raise ValueError('several installations need the same number of --cc and --cxx compilers')
+            for cc, cxx in zip(args.cc, args.cxx):
+                installations.append({'cc': cc, 'cxx': cxx})
+        if installations:
+            parse_installations(args, installations)
+            return
+
+        parser = new_parser(args, args.cc[0] if args.cc else None, args.cxx[0] if args.cxx else None)
+
+        mpi_info = None
+        parsed = False
         if args.cache:
             if os.path.exists(args.cache):
-                args.load = args.cache
-            else:
+                mpi_info = load_blueprint(args.cache)
+                try:
+                    fingerprint = parser.fingerprint()
+                except (OSError, subprocess.CalledProcessError):
+                    logging.warning('MPI toolchain not available, using ' + args.cache + ' without validation')
+                else:
+                    if mpi_info['info'].get('fingerprint') != fingerprint:
+                        logging.info(args.cache + ' does not match the MPI toolchain, parsing again')
+                        mpi_info = None
+            if mpi_info is None:
                 args.dump = args.cache
 
-        if args.load:
+        if mpi_info is None and args.load:
             if args.load == '-':
                 mpi_info = json.load(sys.stdin)
             else:
-                with open(args.load) as file:
-                    mpi_info = json.load(file)
-        else:
-            mpi_info = Parser(
-                cc=args.cc,
-                cxx=args.cxx,
-                exclude_list=args.exclude
-            ).parse()
+                mpi_info = load_blueprint(args.load)
+            mpi_info = select_blueprint(mpi_info, args.include)
+        elif mpi_info is None:
+            mpi_info = parser.parse()
+            parsed = True
+
+        if args.profile and not parsed:
+            logging.warning('No MPI installation was parsed, profile ' + args.profile + ' skipped')
+        elif args.profile:
+            if args.profile == '-':
+                json.dump(parser.profile(), sys.stderr, indent=4)
+            else:
+                with open(args.profile, mode='w') as file:
+                    json.dump(parser.profile(), file, indent=4)
 
         if args.dump:
             if args.dump == '-':
-                json.dump(mpi_info, sys.stdout, indent=4)
+                dump_blueprint(mpi_info, sys.stdout)
             else:
-                with open(args.dump, mode='w') as file:
-                    json.dump(mpi_info, file, indent=4)
-
-        if args.go:
-            logging.info("Generating Go bindings")
-            GoGenerator(
-                package=args.go_package,
-                generic=args.go_generic,
-                out=args.go_out if args.go_out else args.out,
-            ).build(mpi_info)
-            logging.info("Go bindings Ready")
-
-        if args.java:
-            logging.info("Generating Java bindings")
-            java_out = args.java_out if args.java_out else args.out
-            JavaGenerator(
-                class_name=args.java_class,
-                package=args.java_package,
-                out=java_out,
-                lib_name=args.java_lib_name,
-                lib_out=args.java_lib_out if args.java_lib_out else java_out,
-                jdk21=args.jdk21,
-            ).build(mpi_info)
-            logging.info("Java bindings Ready")
+                save_blueprint(mpi_info, args.dump)
+
+        defaults = {
+            'go': {
+                'package': args.go_package,
+                'generic': args.go_generic,
+                'out': args.go_out if args.go_out else args.out,
+                'version': args.go_version,
+                'batch': args.go_batch,
+                'usage': args.go_usage,
+                'progress': args.go_progress,
+            },
+            'java': {
+                'class_name': args.java_class,
+                'package': args.java_package,
+                'out': args.java_out if args.java_out else args.out,
+                'lib_name': args.java_lib_name,
+                'lib_out': args.java_lib_out,
+                'jdk21': args.jdk21,
+            },
+        }
+        targets = [parse_target(kind, defaults) for kind in ('go', 'java') if getattr(args, kind)]
+        targets.extend(parse_target(spec, defaults) for spec in args.targets)
+        changed = build_targets(mpi_info, targets, args.jobs if args.jobs else os.cpu_count() or 1)
+        if args.changed == '-':
+            for path in changed:
+                print(path)
+        elif args.changed:
+            with open(args.changed, mode='w') as file:
+                file.write(''.join(path + '\n' for path in changed))
 
     except KeyboardInterrupt:
         print("\nAborted")
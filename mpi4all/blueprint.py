@@ -0,0 +1,181 @@
+import re
+import json
+import zlib
+import struct
+import bisect
+import itertools
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, List, Iterable, Iterator, TextIO, Union
+
+from mpi4all.parser import _IDENTIFIER_RE, _REQUIRED_MACROS, _combine
+
+_MAGIC = b'\x89M4A\r\n'
+
+_VERSION = 1
+
+_HEADER = struct.Struct('<BI')
+
+_BLOCK_SIZE = 64
+
+_SECTIONS = ('macros', 'function_macros', 'functions')
+
+
+class _Section(Sequence):
+
+    def __init__(self, data: memoryview, blocks: List[List[int]], rows: List[int]):
+        self._data = data
+        self._blocks = blocks
+        self._starts = list(itertools.accumulate((count for _, _, count in blocks), initial=0))
+        self._rows = rows
+        self._decoded: Dict[int, List[Dict[str, Any]]] = dict()
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        block = bisect.bisect_right(self._starts, row) - 1
+        if block not in self._decoded:
+            offset, length, _ = self._blocks[block]
+            self._decoded[block] = json.loads(zlib.decompress(self._data[offset:offset + length]))
+        return self._decoded[block][row - self._starts[block]]
+
+    def subset(self, rows: List[int]) -> '_Section':
+        section = _Section(self._data, self._blocks, [self._rows[i] for i in rows])
+        section._decoded = self._decoded
+        return section
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            return [self._record(row) for row in self._rows[i]]
+        return self._record(self._rows[i])
+
+
+class Blueprint(Mapping):
+
+    def __init__(self, data: bytes):
+        if not data.startswith(_MAGIC):
+            raise ValueError('not a mpi4all blueprint')
+        version, length = _HEADER.unpack_from(data, len(_MAGIC))
+        if version != _VERSION:
+            raise ValueError(f'unsupported blueprint version {version}')
+        start = len(_MAGIC) + _HEADER.size
+        header = json.loads(zlib.decompress(data[start:start + length]))
+        data = memoryview(data)[start + length:]
+
+        self._index = header['sections']
+        self._values = dict()
+        for name in _SECTIONS:
+            section = self._index[name]
+            self._values[name] = _Section(data, section['blocks'], list(range(len(section['names']))))
+        self._values['types'] = header['types']
+        self._values['info'] = header['info']
+
+    def names(self, section: str) -> List[str]:
+        return [self._index[section]['names'][row] for row in self._values[section]._rows]
+
+    def select(self, pattern: re.Pattern) -> 'Blueprint':
+        blueprint = object.__new__(Blueprint)
+        blueprint._index = self._index
+        blueprint._values = dict(self._values)
+
+        functions = self._values['functions']
+        rows = [i for i, name in enumerate(self.names('functions')) if pattern.search(name)]
+        blueprint._values['functions'] = functions.subset(rows)
+        reached = _reached(blueprint._values['functions'])
+
+        macros = self._values['macros']
+        types = self._index['macros']['types']
+        rows = [i for i, name in enumerate(self.names('macros'))
+                if _keep_macro(pattern, name, types[macros._rows[i]], reached)]
+        blueprint._values['macros'] = macros.subset(rows)
+
+        rows = [i for i, name in enumerate(self.names('function_macros')) if pattern.search(name)]
+        blueprint._values['function_macros'] = self._values['function_macros'].subset(rows)
+        return blueprint
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+def _reached(functions: Iterable[Dict[str, Any]]) -> set:
+    reached = set()
+    for f in functions:
+        for tp in [arg['type'] for arg in f['args']] + [f['rtype']]:
+            reached.update(_IDENTIFIER_RE.findall(tp))
+    return reached
+
+
+def _keep_macro(pattern: re.Pattern, name: str, tp: str, reached: set) -> bool:
+    if pattern.search(name) or name in _REQUIRED_MACROS:
+        return True
+    tp = tp.strip(' *')
+    return tp.startswith('MPI_') and tp in reached
+
+
+def _plain(blueprint: Mapping) -> Dict[str, Any]:
+    return {key: list(value) if isinstance(value, _Section) else value for key, value in blueprint.items()}
+
+
+def encode_blueprint(blueprint: Mapping) -> bytes:
+    sections = dict()
+    blocks = list()
+    offset = 0
+    for name in _SECTIONS:
+        records = list(blueprint.get(name, []))
+        index = {'names': [r['name'] for r in records], 'blocks': []}
+        if name == 'macros':
+            index['types'] = [r['type'] for r in records]
+        for i in range(0, len(records), _BLOCK_SIZE):
+            block = zlib.compress(json.dumps(records[i:i + _BLOCK_SIZE], separators=(',', ':')).encode(), 9)
+            index['blocks'].append([offset, len(block), len(records[i:i + _BLOCK_SIZE])])
+            blocks.append(block)
+            offset += len(block)
+        sections[name] = index
+
+    header = zlib.compress(json.dumps({
+        'sections': sections,
+        'types': blueprint['types'],
+        'info': blueprint['info'],
+    }, separators=(',', ':')).encode(), 9)
+    return b''.join([_MAGIC, _HEADER.pack(_VERSION, len(header)), header] + blocks)
+
+
+def load_blueprint(path: str) -> Mapping:
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data.startswith(_MAGIC):
+        return Blueprint(data)
+    return json.loads(data)
+
+
+def save_blueprint(blueprint: Mapping, path: str):
+    if path.endswith('.m4a'):
+        with open(path, 'wb') as file:
+            file.write(encode_blueprint(blueprint))
+    else:
+        with open(path, 'w') as file:
+            dump_blueprint(blueprint, file)
+
+
+def dump_blueprint(blueprint: Mapping, file: TextIO):
+    json.dump(_plain(blueprint), file, indent=4)
+
+
+def select_blueprint(blueprint: Mapping, patterns: List[str]) -> Mapping:
+    pattern = _combine(patterns)
+    if pattern is None:
+        return blueprint
+    if isinstance(blueprint, Blueprint):
+        return blueprint.select(pattern)
+    selected = dict(blueprint)
+    selected['functions'] = [f for f in blueprint['functions'] if pattern.search(f['name'])]
+    reached = _reached(selected['functions'])
+    selected['macros'] = [m for m in blueprint['macros'] if _keep_macro(pattern, m['name'], m['type'], reached)]
+    selected['function_macros'] = [m for m in blueprint.get('function_macros', []) if pattern.search(m['name'])]
+    return selected
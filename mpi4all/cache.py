@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+
+class ProbeCache:
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._values: Dict[str, Any] = dict()
+        self._pending: Dict[str, Future] = dict()
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self._path, key[:2], key[2:])
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+        if self._path is None:
+            return None
+        try:
+            with open(self._file(key)) as file:
+                value = json.load(file)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._values[key] = value
+        return value
+
+    def claim(self, key: str) -> Optional[Future]:
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            self._pending[key] = Future()
+            return None
+
+    def release(self, key: str):
+        with self._lock:
+            future = self._pending.pop(key, None)
+        if future is not None:
+            future.set_result(None)
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._values[key] = value
+            future = self._pending.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+        if self._path is None:
+            return
+        folder = os.path.dirname(self._file(key))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder)
+        with os.fdopen(fd, 'w') as file:
+            json.dump(value, file)
+        os.replace(tmp, self._file(key))
@@ -0,0 +1,172 @@
+import json
+import re
+import subprocess
+from typing import List, Dict, Any, Optional
+
+from mpi4all.parser import Parser, _label
+
+_AST_TEMPLATE = 'template <class T> struct m4a_type {};\n'
+
+_AST_FIRST_LINE = _AST_TEMPLATE.count('\n') + 1
+
+_ERROR_RE = re.compile(r'<stdin>:(\d+):\d+: (?:fatal )?error: (.*)')
+
+_TAG_RE = re.compile(r'\b(struct|union|enum|class)\s+')
+
+_CONST_RE = re.compile(r'\bconst\s+([A-Za-z_][\w ]*?)(?=\s*[*&)\],]|$)')
+
+_FUNCTION_RE = re.compile(r'[^(]*\((?!\*)')
+
+_POINTER_RE = re.compile(r'((?:const )?([A-Za-z_]\w*)) \*')
+
+
+def _ast_nodes(dump: str) -> List[Dict[str, Any]]:
+    decoder = json.JSONDecoder()
+    return [decoder.raw_decode(dump, start.start())[0] for start in re.finditer(r'^\{', dump, re.MULTILINE)]
+
+
+def _errors(stderr: str) -> Dict[int, str]:
+    errors = dict()
+    for line, message in _ERROR_RE.findall(stderr or ''):
+        errors.setdefault(int(line), message)
+    return errors
+
+
+def _qual_type(node: Dict[str, Any]) -> str:
+    return node['type'].get('desugaredQualType', node['type']['qualType'])
+
+
+def _return_type(tp: str) -> str:
+    depth = 0
+    for i in range(len(tp) - 1, -1, -1):
+        if tp[i] == ')':
+            depth += 1
+        elif tp[i] == '(':
+            depth -= 1
+            if depth == 0:
+                return tp[:i].strip()
+    return tp
+
+
+def _gnu_name(tp: str) -> str:
+    tp = _TAG_RE.sub('', tp).strip()
+    if not re.search(r'[*&(\[]', tp):
+        tp = re.sub(r'\b(const|volatile)\s+', '', tp)
+    tp = re.sub(r'\s*\bconst$', '', tp)
+    tp = _CONST_RE.sub(r'\1 const', tp)
+    tp = re.sub(r'\s+(?=[*&])', '', tp)
+    return tp.replace(')[', ') [')
+
+
+class ClangParser(Parser):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._typedefs: Dict[str, str] = dict()
+        self._params: Dict[str, List[str]] = dict()
+
+    def _ast(self, compiler, *args: str, text: str = '', purpose: str = 'ast',
+             label: Optional[str] = None) -> subprocess.CompletedProcess:
+        return compiler(*self._prelude, '-fsyntax-only', '-ferror-limit=0', '-Xclang', '-ast-dump=json', *args, '-',
+                        text=text, check=False, purpose=purpose, label=label)
+
+    def _build_prelude(self, wd: str):
+        pass
+
+    def _c_info_batch(self, names: List[str], wd: str, purpose: str) -> Dict[str, tuple]:
+        probes = '\n'.join(f'm4a_type<__typeof__({name})> m4a_c_{i}; char (*m4a_s_{i})[sizeof({name})];'
+                           for i, name in enumerate(names))
+        result = self._ast(self._cxx, '-Xclang', '-ast-dump-filter=m4a_', '-x', 'c++', text=_AST_TEMPLATE + probes,
+                           purpose=purpose, label=_label(names))
+        nodes = {node['name']: node for node in _ast_nodes(result.stdout)
+                 if node.get('kind') == 'VarDecl' and not node.get('isInvalid')}
+        errors = _errors(result.stderr)
+
+        info = dict()
+        for i, name in enumerate(names):
+            error = errors.get(i + _AST_FIRST_LINE, result.stderr or 'not found')
+            if f'm4a_c_{i}' not in nodes:
+                info[name] = None, None, error
+                continue
+            typename = _gnu_name(_qual_type(nodes[f'm4a_c_{i}'])[len('m4a_type<'):-1])
+            size = re.search(r'\[(\d+)\]', _qual_type(nodes[f'm4a_s_{i}'])) if f'm4a_s_{i}' in nodes else None
+            if size is not None:
+                info[name] = typename, size.group(1), None
+            elif _FUNCTION_RE.match(typename):
+                info[name] = typename, '1', None
+            else:
+                info[name] = None, None, error
+        return info
+
+    def _c_info(self, name: str, wd: str, purpose: str) -> (str, int, str):
+        return self._c_info_batch([name], wd, purpose)[name]
+
+    def _c_var_batch(self, names: List[str]) -> Dict[str, bool]:
+        test_code = '\n'.join(f'auto m4a_v_{i} = {name};' for i, name in enumerate(names))
+        result = self._cxx(*self._prelude, '-fsyntax-only', '-ferror-limit=0', '-x', 'c++', '-', text=test_code,
+                           check=False, purpose='var check', label=_label(names))
+        errors = _errors(result.stderr)
+        return {name: i + 1 not in errors for i, name in enumerate(names)}
+
+    def _c_var(self, name: str) -> bool:
+        return self._c_var_batch([name])[name]
+
+    def _cached(self, kind: str, names: List[str], probe) -> Dict[str, Any]:
+        return super()._cached('ast-' + kind, names, probe)
+
+    def _is_function(self, tp: str) -> bool:
+        seen = set()
+        while tp in self._typedefs and tp not in seen:
+            seen.add(tp)
+            tp = self._typedefs[tp]
+        return _FUNCTION_RE.match(tp) is not None
+
+    def _aux_type(self, tp: str) -> str:
+        pointer = _POINTER_RE.fullmatch(tp)
+        if pointer and self._is_function(pointer.group(2)):
+            return pointer.group(1) + ' (*)'
+        return tp
+
+    def _parse_headers(self, wd: str) -> List[Dict[str, Any]]:
+        dump = self._ast(self._cc, '-Xclang', '-ast-dump-filter=MPI_', '-x', 'c')
+        try:
+            dump.check_returncode()
+        except subprocess.CalledProcessError as ex:
+            raise RuntimeError(self._cc.args[0] + ' can not dump the AST, the clang-ast engine requires clang\n' +
+                               ex.stderr)
+
+        functions = dict()
+        for node in _ast_nodes(dump.stdout):
+            if node.get('kind') == 'TypedefDecl':
+                self._typedefs.setdefault(node['name'], _qual_type(node))
+            elif node.get('kind') == 'FunctionDecl':
+                functions.setdefault(node['name'], node)
+
+        headers = list()
+        for name, node in functions.items():
+            if not name.startswith('MPI_') or self._is_excluded(name) or not self._is_included(name):
+                continue
+            params = [param for param in node.get('inner', []) if param.get('kind') == 'ParmVarDecl']
+            rtype = _return_type(node['type']['qualType'])
+            types = [self._aux_type(param['type']['qualType']) for param in params]
+            self._params[name] = [param.get('name', '') for param in params]
+            if node.get('variadic') or node['type']['qualType'].endswith('...)'):
+                types.append('...')
+                self._params[name].append('')
+
+            headers.append({
+                'header': f'{rtype} {name} ({", ".join(types) if types else "void"})',
+                'rtype': rtype,
+                'name': name,
+                'args': [{'type': tp} for tp in types] if types else [{'type': 'void'}],
+            })
+
+        return headers
+
+    def _param_decls(self) -> Dict[str, List[str]]:
+        return self._params
+
+    def fingerprint(self) -> Dict[str, str]:
+        fingerprint = super().fingerprint()
+        fingerprint['engine'] = 'clang-ast'
+        return fingerprint
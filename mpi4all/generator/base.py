@@ -1,5 +1,8 @@
 import io
-from typing import Dict, Any
+import hashlib
+import logging
+import os
+from typing import Dict, Any, List
 from mpi4all.version import __version__
 
 
@@ -8,6 +11,36 @@ class BaseGenerator:
     def __init__(self, prefix='M4A'):
         self._prefix = prefix + '_'
         self._c_source = io.StringIO()
+        self._c_header = io.StringIO()
+        self._c_definitions = io.StringIO()
+        self._outputs: Dict[str, bool] = dict()
+
+    def _output(self, path: str, *parts: str) -> bool:
+        content = ''.join(parts)
+        try:
+            with open(path) as file:
+                unchanged = hashlib.sha256(file.read().encode()).digest() == hashlib.sha256(content.encode()).digest()
+        except (OSError, UnicodeDecodeError):
+            unchanged = False
+        if unchanged:
+            logging.info(path + ' unchanged')
+        else:
+            with open(path, 'w') as file:
+                file.write(content)
+            logging.info(path + ' updated')
+        self._outputs[path] = not unchanged
+        return not unchanged
+
+    def _discard(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        logging.info(path + ' removed')
+        self._outputs[path] = True
+        return True
+
+    def changed(self) -> List[str]:
+        return [path for path, changed in self._outputs.items() if changed]
 
     def _build_macros(self, info: Dict[str, Any]):
         c_source = self._c_source
@@ -20,15 +53,17 @@ class BaseGenerator:
         for macro in sorted(info['macros'], key=lambda m: m['name']):
             if not macro['var']:
                 if macro['type'][-1] == ')' and macro['type'][0] != '(':
-                    c_source.write(
-                        'typedef ' + macro['type'].replace('(', f'(*{self._prefix}' + macro['name'] + ')(', 1) + ';\n')
+                    typedef = 'typedef ' + macro['type'].replace('(', f'(*{self._prefix}' + macro['name'] + ')(', 1)
                 else:
-                    c_source.write('typedef ' + macro['type'] + f' {self._prefix}' + macro['name'] + ';\n')
+                    typedef = 'typedef ' + macro['type'] + f' {self._prefix}' + macro['name']
+                c_source.write(typedef + ';\n')
+                self._c_header.write(typedef + ';\n')
                 self._write_macro(macro)
                 continue
-            c_type = macro['type']
-            c_source.write(self._c_dec(c_type, self._prefix + macro['name']))
-            c_source.write(' = ' + macro['name'] + ';\n')
+            c_dec = self._c_dec(macro['type'], self._prefix + macro['name'])
+            c_source.write(c_dec + ' = ' + macro['name'] + ';\n')
+            self._c_header.write('extern ' + c_dec + ';\n')
+            self._c_definitions.write(c_dec + ' = ' + macro['name'] + ';\n')
             self._write_macro(macro)
 
     def _write_macro(self, macro: Dict[str, str]):
@@ -50,7 +85,7 @@ class BaseGenerator:
             'rtype': vfun['rtype'],
             'args': list()
         }
-        self._c_source.write(vfun['rtype'] + ' ' + fun['name'] + '(')
+        signature = vfun['rtype'] + ' ' + fun['name'] + '('
         call = vfun['name'] + '('
 
         first = True
@@ -59,17 +94,19 @@ class BaseGenerator:
                 break
             if not first:
                 call += ', '
-                self._c_source.write(', ')
+                signature += ', '
             first = False
-            self._c_source.write(self._c_dec(arg['type'], arg['name']))
+            signature += self._c_dec(arg['type'], arg['name'])
             call += arg['name']
             fun['args'].append(arg)
 
-        self._c_source.write('){')
+        signature += ')'
         call += ');'
         if vfun['rtype'] != 'void':
-            self._c_source.write('return ')
-        self._c_source.write(call + '}\n')
+            call = 'return ' + call
+        self._c_header.write(signature + ';\n')
+        self._c_source.write(signature + '{' + call + '}\n')
+        self._c_definitions.write(signature + '{' + call + '}\n')
 
         return fun
 
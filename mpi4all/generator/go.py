@@ -1,9 +1,11 @@
 import os
+import re
 
 import logging
 import io
-from typing import Dict
+from typing import Dict, Any, Set
 
+from mpi4all.blueprint import select_blueprint
 from mpi4all.generator.base import BaseGenerator
 
 _KEYWORDS = {'break', 'default', 'func', 'interface', 'select', 'case', 'defer', 'go', 'map', 'struct', 'chan', 'else',
@@ -42,12 +44,9 @@ func C_ArrayToString(array []C_char) string {
 
 func C_ArrayFromString(str string) []C_char {
     array := make([]C_char, len(str)+1)
-    for i, c := range str {
-        array[i] = C_char(c)
-    }
-    array[len(str)] = '\\x00'
+    copy(unsafe.Slice((*byte)(unsafe.Pointer(&array[0])), len(str)), str)
     return array
-}  
+}
 
 func C_NULL() unsafe.Pointer { return unsafe.Pointer(nil) }
 
@@ -71,19 +70,651 @@ func PA[T any](ptr *[]T) unsafe.Pointer {
 }
 """
 
+_GO_SHARDS = [
+    ('tools', re.compile(r'MPI_(T_\w+|Pcontrol)$', re.IGNORECASE)),
+    ('io', re.compile(r'MPI_(File_\w+|Register_datarep\w*)$', re.IGNORECASE)),
+    ('rma', re.compile(r'MPI_(Win_\w+|R?put|R?get|R?accumulate|R?get_accumulate|Fetch_and_op|Compare_and_swap)$',
+                       re.IGNORECASE)),
+    ('collectives', re.compile(r'MPI_I?(Barrier|Bcast|Gatherv?|Scatterv?|Allgatherv?|Alltoall[vw]?|Reduce|Allreduce|'
+                               r'Reduce_scatter(_block)?|Reduce_local|Scan|Exscan|Neighbor_\w+)(_init)?$',
+                               re.IGNORECASE)),
+    ('p2p', re.compile(r'MPI_(I?[bsr]?send|I?recv|Sendrecv(_replace)?|[bsrp]?send_init|P?recv_init|I?m?probe|I?mrecv|'
+                       r'Wait(all|any|some)?|Test(all|any|some|_cancelled)?|Start(all)?|Request_\w+|Cancel|'
+                       r'Buffer_\w+|Get_count|Pready\w*|Parrived)$', re.IGNORECASE)),
+]
+_GO_STRING_FUNCTIONS = """\
+func C_ArrayAsString(array []C_char) string {
+    bytes := unsafe.Slice((*byte)(unsafe.Pointer(&array[0])), len(array))
+    for i, b := range bytes {
+        if b == 0 {
+            return unsafe.String(&bytes[0], i)
+        }
+    }
+    return unsafe.String(&bytes[0], len(bytes))
+}
+
+func BytesAsString(bytes []byte) string {
+    return unsafe.String(unsafe.SliceData(bytes), len(bytes))
+}
+
+func StringAsBytes(str string) []byte {
+    return unsafe.Slice(unsafe.StringData(str), len(str))
+}
+
+"""
+
+_GO_PINNED = """\
+// Wait and Test unpin every buffer pinned on a Pinned, so use one Pinned per request.
+type Pinned struct {
+    pinner runtime.Pinner
+}
+
+func (p *Pinned) Pin(ptr any) {
+    p.pinner.Pin(ptr)
+}
+
+func (p *Pinned) Unpin() {
+    p.pinner.Unpin()
+}
+
+"""
+
+_GO_PINNED_WAIT = """\
+func (p *Pinned) Wait(request *C_MPI_Request, status *C_MPI_Status) error {
+    defer p.pinner.Unpin()
+    return MPI_Wait(request, status)
+}
+
+"""
+
+_GO_PINNED_TEST = """\
+func (p *Pinned) Test(request *C_MPI_Request, flag *C_int, status *C_MPI_Status) error {
+    err := MPI_Test(request, flag, status)
+    if err == nil && *flag != 0 {
+        p.pinner.Unpin()
+    }
+    return err
+}
+
+"""
+
+_GO_GENERIC_BUFFERS = """\
+func C_Slice[T any](ptr unsafe.Pointer, n int) []T {
+    return unsafe.Slice((*T)(ptr), n)
+}
+
+"""
+
+_GO_GENERIC_PINNED = """\
+func PinPA[T any](p *Pinned, ptr *[]T) unsafe.Pointer {
+    if len(*ptr) > 0 {
+        p.pinner.Pin(&(*ptr)[0])
+    }
+    return PA(ptr)
+}
+
+"""
+_GO_ALLOCATOR = """\
+var ErrAllocAlign = errors.New("Allocator alignment must be a power of two")
+
+type Allocator struct {
+    mutex  sync.Mutex
+    slab   int
+    slabs  []unsafe.Pointer
+    base   unsafe.Pointer
+    offset int
+}
+
+func NewAllocator(slab int) *Allocator {
+    return &Allocator{slab: slab}
+}
+
+func (a *Allocator) alloc(size int) (unsafe.Pointer, error) {
+    var base unsafe.Pointer
+    if err := MPI_Alloc_mem(C_MPI_Aint(size), MPI_INFO_NULL, unsafe.Pointer(&base)); err != nil {
+        return nil, err
+    }
+    a.slabs = append(a.slabs, base)
+    return base, nil
+}
+
+func (a *Allocator) Alloc(size int, align int) (unsafe.Pointer, error) {
+    if align < 1 || align&(align-1) != 0 {
+        return nil, ErrAllocAlign
+    }
+    a.mutex.Lock()
+    defer a.mutex.Unlock()
+    if size+align > a.slab {
+        return a.alloc(size)
+    }
+    pad := int(-(uintptr(a.base) + uintptr(a.offset)) & uintptr(align-1))
+    if a.base == nil || a.offset+pad+size > a.slab {
+        base, err := a.alloc(a.slab)
+        if err != nil {
+            return nil, err
+        }
+        a.base, a.offset, pad = base, 0, int(-uintptr(base)&uintptr(align-1))
+    }
+    ptr := unsafe.Add(a.base, a.offset+pad)
+    a.offset += pad + size
+    return ptr, nil
+}
+
+func (a *Allocator) Bytes(n int) ([]byte, error) {
+    ptr, err := a.Alloc(n, 1)
+    if err != nil {
+        return nil, err
+    }
+    return unsafe.Slice((*byte)(ptr), n), nil
+}
+
+func (a *Allocator) Free() error {
+    a.mutex.Lock()
+    defer a.mutex.Unlock()
+    var first error
+    for _, slab := range a.slabs {
+        if err := MPI_Free_mem(slab); err != nil && first == nil {
+            first = err
+        }
+    }
+    a.slabs, a.base, a.offset = nil, nil, 0
+    return first
+}
+
+"""
+
+_GO_GENERIC_ALLOCATOR = """\
+var ErrAllocPointers = errors.New("Allocator memory is not scanned by the GC, types with Go pointers are not allowed")
+
+func pointerFree(t reflect.Type) bool {
+    switch t.Kind() {
+    case reflect.Array:
+        return t.Len() == 0 || pointerFree(t.Elem())
+    case reflect.Struct:
+        for i := 0; i < t.NumField(); i++ {
+            if !pointerFree(t.Field(i).Type) {
+                return false
+            }
+        }
+        return true
+    case reflect.Ptr, reflect.UnsafePointer, reflect.Map, reflect.Chan, reflect.Func, reflect.Interface,
+        reflect.Slice, reflect.String:
+        return false
+    }
+    return true
+}
+
+// Alloc memory is not scanned by the GC, so T must not contain Go pointers.
+func Alloc[T any](a *Allocator, n int) ([]T, error) {
+    var zero T
+    if !pointerFree(reflect.TypeOf(&zero).Elem()) {
+        return nil, ErrAllocPointers
+    }
+    ptr, err := a.Alloc(n*int(unsafe.Sizeof(zero)), int(unsafe.Alignof(zero)))
+    if err != nil {
+        return nil, err
+    }
+    return unsafe.Slice((*T)(ptr), n), nil
+}
+
+"""
+_GO_DATATYPE = """\
+var ErrSliceLength = errors.New("Slice buffer shorter than the send buffer")
+
+type DatatypeError struct {
+    Type reflect.Type
+}
+
+func (e *DatatypeError) Error() string {
+    return "No MPI datatype for " + e.Type.String()
+}
+
+var datatypes sync.Map
+
+var datatypeMutex sync.Mutex
+
+func Datatype[T any]() (C_MPI_Datatype, error) {
+    t := reflect.TypeOf((*T)(nil)).Elem()
+    if datatype, ok := datatypes.Load(t); ok {
+        return datatype.(C_MPI_Datatype), nil
+    }
+    datatypeMutex.Lock()
+    defer datatypeMutex.Unlock()
+    return datatypeFor(t)
+}
+
+func datatypeFor(t reflect.Type) (C_MPI_Datatype, error) {
+    if datatype, ok := datatypes.Load(t); ok {
+        return datatype.(C_MPI_Datatype), nil
+    }
+    datatype, ok := datatypeOf(t)
+    if !ok {
+        if t.Kind() != reflect.Struct && t.Kind() != reflect.Array {
+            return datatype, &DatatypeError{t}
+        }
+        var err error
+        if datatype, err = derivedOf(t); err != nil {
+            return datatype, err
+        }
+    }
+    datatypes.Store(t, datatype)
+    return datatype, nil
+}
+
+"""
+
+_GO_DERIVED = """\
+func derivedOf(t reflect.Type) (datatype C_MPI_Datatype, err error) {
+    var blocks []C_int
+    var offsets []C_MPI_Aint
+    var types []C_MPI_Datatype
+    if t.Kind() == reflect.Array {
+        inner, err := datatypeFor(t.Elem())
+        if err != nil {
+            return datatype, err
+        }
+        blocks, offsets, types = []C_int{C_int(t.Len())}, []C_MPI_Aint{0}, []C_MPI_Datatype{inner}
+    } else {
+        for i := 0; i < t.NumField(); i++ {
+            field := t.Field(i)
+            if field.Name == "_" || field.Type.Size() == 0 {
+                continue
+            }
+            inner, err := datatypeFor(field.Type)
+            if err != nil {
+                return datatype, err
+            }
+            blocks = append(blocks, 1)
+            offsets = append(offsets, C_MPI_Aint(field.Offset))
+            types = append(types, inner)
+        }
+    }
+    if len(blocks) == 0 {
+        return datatype, &DatatypeError{t}
+    }
+
+    var packed C_MPI_Datatype
+    if err = MPI_Type_create_struct(C_int(len(blocks)), &blocks[0], &offsets[0], &types[0], &packed); err != nil {
+        return
+    }
+    if err = MPI_Type_create_resized(packed, 0, C_MPI_Aint(t.Size()), &datatype); err != nil {
+        return
+    }
+    if err = MPI_Type_free(&packed); err != nil {
+        return
+    }
+    err = MPI_Type_commit(&datatype)
+    return
+}
+
+"""
+
+_GO_NO_DERIVED = """\
+func derivedOf(t reflect.Type) (datatype C_MPI_Datatype, err error) {
+    return datatype, &DatatypeError{t}
+}
+
+"""
+
+_GO_DERIVED_FUNCTIONS = {'MPI_Type_create_struct', 'MPI_Type_create_resized', 'MPI_Type_free', 'MPI_Type_commit'}
+
+_GO_DATATYPES = [
+    (['Int', 'Int8', 'Int16', 'Int32', 'Int64'],
+     {1: 'MPI_INT8_T', 2: 'MPI_INT16_T', 4: 'MPI_INT32_T', 8: 'MPI_INT64_T'}),
+    (['Uint', 'Uint8', 'Uint16', 'Uint32', 'Uint64', 'Uintptr'],
+     {1: 'MPI_UINT8_T', 2: 'MPI_UINT16_T', 4: 'MPI_UINT32_T', 8: 'MPI_UINT64_T'}),
+    (['Float32', 'Float64'], {4: 'MPI_FLOAT', 8: 'MPI_DOUBLE'}),
+    (['Complex64', 'Complex128'], {8: 'MPI_C_FLOAT_COMPLEX', 16: 'MPI_C_DOUBLE_COMPLEX'}),
+    (['Bool'], {1: 'MPI_C_BOOL'}),
+]
+_GO_THREAD_LEVELS = ['MPI_THREAD_SINGLE', 'MPI_THREAD_FUNNELED', 'MPI_THREAD_SERIALIZED', 'MPI_THREAD_MULTIPLE']
+
+_GO_PROGRESS = """\
+type Completion struct {
+    Status C_MPI_Status
+    Err    error
+}
+
+type progressRequest struct {
+    request  C_MPI_Request
+    callback func(Completion)
+}
+
+var ErrProgressThreadLevel = errors.New("Progress needs MPI initialized with MPI_THREAD_MULTIPLE")
+
+var ErrProgressClosed = errors.New("Progress is closed")
+
+type Progress struct {
+    idle    time.Duration
+    submit  chan progressRequest
+    mutex   sync.Mutex
+    closed  bool
+    closing chan struct{}
+    done    chan struct{}
+}
+
+func NewProgress(idle time.Duration) (*Progress, error) {
+    var provided C_int
+    if err := MPI_Query_thread(&provided); err != nil {
+        return nil, err
+    }
+    if provided < C_int(C.MPI_THREAD_MULTIPLE) {
+        return nil, ErrProgressThreadLevel
+    }
+    p := &Progress{
+        idle:    idle,
+        submit:  make(chan progressRequest, 256),
+        closing: make(chan struct{}),
+        done:    make(chan struct{}),
+    }
+    go p.run()
+    return p, nil
+}
+
+func (p *Progress) Notify(request C_MPI_Request, callback func(Completion)) error {
+    p.mutex.Lock()
+    defer p.mutex.Unlock()
+    if p.closed {
+        return ErrProgressClosed
+    }
+    p.submit <- progressRequest{request, callback}
+    return nil
+}
+
+func (p *Progress) Await(request C_MPI_Request) (<-chan Completion, error) {
+    completion := make(chan Completion, 1)
+    if err := p.Notify(request, func(c Completion) { completion <- c }); err != nil {
+        return nil, err
+    }
+    return completion, nil
+}
+
+func (p *Progress) Close() {
+    p.mutex.Lock()
+    if !p.closed {
+        p.closed = true
+        close(p.closing)
+    }
+    p.mutex.Unlock()
+    <-p.done
+}
+
+func (p *Progress) run() {
+    runtime.LockOSThread()
+    defer runtime.UnlockOSThread()
+    defer close(p.done)
+
+    var requests []C_MPI_Request
+    var callbacks []func(Completion)
+    var indices []C_int
+    var statuses []C_MPI_Status
+    closing := p.closing
+    for {
+        if len(requests) == 0 {
+            if closing == nil && len(p.submit) == 0 {
+                return
+            }
+            select {
+            case r := <-p.submit:
+                requests, callbacks = append(requests, r.request), append(callbacks, r.callback)
+            case <-closing:
+                closing = nil
+                continue
+            }
+        }
+        for pending := true; pending; {
+            select {
+            case r := <-p.submit:
+                requests, callbacks = append(requests, r.request), append(callbacks, r.callback)
+            case <-closing:
+                closing = nil
+            default:
+                pending = false
+            }
+        }
+        if len(indices) < len(requests) {
+            indices = make([]C_int, cap(requests))
+            statuses = make([]C_MPI_Status, cap(requests))
+        }
+
+        var outcount C_int
+        err := MPI_Testsome(C_int(len(requests)), &requests[0], &outcount, &indices[0], &statuses[0])
+        e, ok := err.(*MpiError)
+        if err != nil && (!ok || e.Code != int(MPI_ERR_IN_STATUS)) || outcount == MPI_UNDEFINED {
+            for _, callback := range callbacks {
+                callback(Completion{Err: err})
+            }
+            requests, callbacks = requests[:0], callbacks[:0]
+            continue
+        }
+        for i := 0; i < int(outcount); i++ {
+            c := Completion{Status: statuses[i]}
+            if err != nil {
+                c.Err = mpi_check(statuses[i].MPI_ERROR)
+            }
+            callbacks[indices[i]](c)
+            callbacks[indices[i]] = nil
+        }
+        if outcount == 0 {
+            if p.idle > 0 {
+                time.Sleep(p.idle)
+            } else {
+                runtime.Gosched()
+            }
+            continue
+        }
+        n := 0
+        for i := range requests {
+            if callbacks[i] != nil {
+                requests[n], callbacks[n] = requests[i], callbacks[i]
+                n++
+            }
+        }
+        requests, callbacks = requests[:n], callbacks[:n]
+    }
+}
+
+"""
+
+_GO_SHIM = 'mpi4all'
+
+_GO_FILES = ['misc', 'batch', 'buffers', 'slices', 'progress']
+
+_GO_IMPORTS = ['errors', 'reflect', 'runtime', 'sync', 'time', 'unsafe']
+
+_GO_ANNOTATIONS = (1, 24)
+
+_GO_CALLBACK_RE = re.compile(r'MPI_(\w+_(set_attr|delete_attr|free|i?dup(_with_info)?|disconnect|call_errhandler)|'
+                             r'Attr_\w+|Grequest_\w+|Finalize)$')
+
+_GO_RETAIN_RE = re.compile(r'MPI_(I(?!nfo_|nit|ntercomm_|s_thread_main)\w+|\w+_init|R?put|R?get|R?accumulate|'
+                           r'R?get_accumulate|Fetch_and_op|Compare_and_swap|Buffer_attach|Win_(create|attach)|'
+                           r'File_i\w+|File_\w+_begin|\w+_idup(_with_info)?)$')
+
+_GO_COMPLETION_RE = re.compile(r'MPI_((Wait|Test)(all|any|some)?|Request_get_status\w*|Cancel)$')
+
+_GO_BATCH_TYPE = """\
+// Batch arguments are kept in C memory, so pointer arguments must not point to Go memory.
+type Batch struct {
+    ops  []C.M4A_Batch_op
+    size int
+}
+
+func (b *Batch) Free() {
+    if b.ops != nil {
+        C.free(unsafe.Pointer(&b.ops[0]))
+    }
+    b.ops, b.size = nil, 0
+}
+
+func (b *Batch) Reset() { b.size = 0 }
+
+"""
+
+_GO_PINNED_BATCH_TYPE = """\
+// Batch pointer arguments are pinned until Reset, so requests started by a Batch must complete before it.
+type Batch struct {
+    ops    []C.M4A_Batch_op
+    size   int
+    pinner runtime.Pinner
+}
+
+func (b *Batch) Free() {
+    b.pinner.Unpin()
+    if b.ops != nil {
+        C.free(unsafe.Pointer(&b.ops[0]))
+    }
+    b.ops, b.size = nil, 0
+}
+
+func (b *Batch) Reset() {
+    b.pinner.Unpin()
+    b.size = 0
+}
+
+"""
+
+_GO_BATCH = """\
+func NewBatch(capacity int) *Batch {
+    if capacity < 1 {
+        capacity = 1
+    }
+    ops := (*C.M4A_Batch_op)(C.malloc(C.size_t(capacity) * C.sizeof_M4A_Batch_op))
+    return &Batch{ops: unsafe.Slice(ops, capacity)}
+}
+
+func (b *Batch) Len() int { return b.size }
+
+func (b *Batch) add(op C.int) unsafe.Pointer {
+    if b.size == len(b.ops) {
+        ops := (*C.M4A_Batch_op)(C.realloc(unsafe.Pointer(&b.ops[0]), C.size_t(2*len(b.ops))*C.sizeof_M4A_Batch_op))
+        b.ops = unsafe.Slice(ops, 2*len(b.ops))
+    }
+    b.ops[b.size].op = op
+    b.size++
+    return unsafe.Pointer(&b.ops[b.size-1].args)
+}
+
+func (b *Batch) Run() error {
+    if b.size == 0 || C.M4A_Batch_run(&b.ops[0], C.int(b.size)) == 0 {
+        return nil
+    }
+    for i := 0; i < b.size; i++ {
+        if err := b.Result(i); err != nil {
+            return err
+        }
+    }
+    return nil
+}
+
+func (b *Batch) Result(i int) error {
+    return mpi_check(b.ops[i].result)
+}
+
+"""
+
+_GO_HELPER_USES = {
+    'Allocator': ['MPI_Alloc_mem', 'MPI_Free_mem', 'MPI_INFO_NULL'],
+    'NewAllocator': ['MPI_Alloc_mem', 'MPI_Free_mem', 'MPI_INFO_NULL'],
+    'Alloc': ['MPI_Alloc_mem', 'MPI_Free_mem', 'MPI_INFO_NULL'],
+    'Pinned': ['MPI_Wait', 'MPI_Test'],
+    'PinPA': ['MPI_Wait', 'MPI_Test'],
+    'Progress': ['MPI_Query_thread', 'MPI_Testsome', 'MPI_UNDEFINED', 'MPI_ERR_IN_STATUS'],
+    'NewProgress': ['MPI_Query_thread', 'MPI_Testsome', 'MPI_UNDEFINED', 'MPI_ERR_IN_STATUS'],
+    'Datatype': [name for _, sizes in _GO_DATATYPES for name in sizes.values()] + sorted(_GO_DERIVED_FUNCTIONS),
+}
+
+_GO_SELECTOR_RE = re.compile(r'\.\s*([A-Za-z_]\w*)')
+
+
+def _go_usage(path: str, package: str, skip: str) -> Set[str]:
+    imported = re.compile(r'"(?:[^"]*/)?' + re.escape(package) + '"')
+    used = set()
+    for root, folders, files in os.walk(path):
+        folders[:] = [folder for folder in folders if folder != 'vendor' and not folder.startswith('.') and
+                      os.path.abspath(os.path.join(root, folder)) != skip]
+        for name in files:
+            if not name.endswith('.go'):
+                continue
+            with open(os.path.join(root, name)) as file:
+                source = file.read()
+            if imported.search(source):
+                used.update(_GO_SELECTOR_RE.findall(source))
+    slices = {'MPI_' + name[:-len('Slice')] for name in used if name.endswith('Slice')}
+    if slices:
+        used.update(slices, ['Datatype'])
+    for helper, names in _GO_HELPER_USES.items():
+        if helper in used:
+            used.update(names)
+    return {name for name in used if name.startswith('MPI_')}
+
+
+def _go_version(version: str) -> tuple:
+    match = re.fullmatch(r'(?:go)?(\d+)\.(\d+)(\.\d+)?', version.strip())
+    if match is None:
+        raise ValueError(f'invalid Go version {version}, expected major.minor')
+    return int(match.group(1)), int(match.group(2))
+
+
+def _annotations(name: str, fun: Dict[str, Any]) -> str:
+    if _GO_CALLBACK_RE.match(name) or any('(' in arg['type'] for arg in fun['args']):
+        return ''
+    annotations = ''
+    if not _GO_RETAIN_RE.match(name):
+        annotations += f'#cgo noescape {fun["name"]}\n'
+    if not _GO_COMPLETION_RE.match(name) and not any(arg['type'] == 'MPI_Op' for arg in fun['args']):
+        annotations += f'#cgo nocallback {fun["name"]}\n'
+    return annotations
+
+
+def _batchable(fun: Dict[str, Any]) -> bool:
+    if _GO_RETAIN_RE.match(fun['name']) and not fun['name'].startswith('MPI_I'):
+        return False
+    return _shard(fun['name']) == 'p2p' and fun['rtype'] == 'int' and 'vargs' not in fun and all(
+        arg.get('name') and '[' not in arg['type'] and '(' not in arg['type'] for arg in fun['args'])
+
+
+def _slice_buffers(fun: Dict[str, Any]) -> range:
+    types = [arg['type'] for arg in fun['args']]
+    if fun['rtype'] != 'int' or 'vargs' in fun or types.count('MPI_Datatype') != 1:
+        return range(0)
+    count = types.index('MPI_Datatype') - 1
+    if count < 1 or types[count] not in ('int', 'MPI_Count'):
+        return range(0)
+    first = count
+    while first > 0 and types[first - 1] in ('void *', 'const void *'):
+        first -= 1
+    if _GO_RETAIN_RE.match(fun['name']) or count - first > 1 and fun['args'][count]['name'] != 'count':
+        return range(0)
+    return range(first, count)
+
+
+def _shard(name: str) -> str:
+    for shard, pattern in _GO_SHARDS:
+        if pattern.match(name):
+            return shard
+    return 'misc'
+
 
 class GoGenerator(BaseGenerator):
 
-    def __init__(self, package: str, generic: str, out: str):
+    def __init__(self, package: str, generic: str, out: str, version: str = '1.18', batch: bool = False,
+                 usage: str = None, progress: bool = False):
         super().__init__()
         self._package = package
         self._generic = generic
         self._out = out
+        self._version = _go_version(version)
+        self._batch = batch
+        self._usage = usage
+        self._progress = progress
         #
         self._unsafe = False
         self._go_types_dec = set()
         self._go_types = io.StringIO()
         self._go_source = io.StringIO()
+        self._go_shards = {shard: io.StringIO() for shard in [shard for shard, _ in _GO_SHARDS] + _GO_FILES}
+        self._go_annotations = {shard: io.StringIO() for shard in self._go_shards}
 
     def _typeAsGo(self, c_type: str):
         go_type = 'C_' + c_type.replace('const', '').replace(' ', '')
@@ -134,13 +765,143 @@ class GoGenerator(BaseGenerator):
             if dec is not None:
                 self._declare(dec)
             else:
-                self.unsafe = True
+                self._unsafe = True
 
             self._go_source.write(
                 'var ' + macro['name'] + ' ' + go_type + ' = ' + f'C.{self._prefix}' + macro['name'] + '\n')
 
+    def _build_batch(self, functions):
+        c_header, c_source = self._c_header, self._c_definitions
+        go_source = self._go_shards['batch']
+        logging.info('Generating Go batch functions')
+
+        c_header.write('\nenum {\n')
+        for i, fun in enumerate(functions):
+            c_header.write(f'    {self._prefix}BATCH_{fun["name"]} = {i + 1},\n')
+        c_header.write('};\n\n')
+        for fun in functions:
+            c_header.write('typedef struct {\n')
+            for arg in fun['args']:
+                c_header.write('    ' + self._c_dec(arg['type'].replace('const ', ''), arg['name']) + ';\n')
+            c_header.write(f'}} {self._prefix}Batch_{fun["name"]};\n\n')
+        c_header.write('typedef struct {\n    int op;\n    int result;\n    union {\n')
+        for fun in functions:
+            c_header.write(f'        {self._prefix}Batch_{fun["name"]} {fun["name"]};\n')
+        c_header.write(f'    }} args;\n}} {self._prefix}Batch_op;\n\n')
+        c_header.write(f'int {self._prefix}Batch_run({self._prefix}Batch_op *ops, int n);\n')
+
+        c_source.write(f'int {self._prefix}Batch_run({self._prefix}Batch_op *ops, int n){{\n')
+        c_source.write('    int failed = 0;\n    for (int i = 0; i < n; i++) {\n        switch (ops[i].op) {\n')
+        for fun in functions:
+            args = ', '.join(f'ops[i].args.{fun["name"]}.{arg["name"]}' for arg in fun['args'])
+            c_source.write(f'        case {self._prefix}BATCH_{fun["name"]}: ')
+            c_source.write(f'ops[i].result = {fun["name"]}({args}); break;\n')
+        c_source.write('        default: ops[i].result = MPI_ERR_OTHER;\n        }\n')
+        c_source.write('        if (ops[i].result != MPI_SUCCESS) failed++;\n    }\n    return failed;\n}\n')
+
+        if self._version >= _GO_ANNOTATIONS and not any(
+                _GO_COMPLETION_RE.match(fun['name']) or _GO_CALLBACK_RE.match(fun['name']) for fun in functions):
+            self._go_annotations['batch'].write(f'#cgo nocallback {self._prefix}Batch_run\n')
+        pinned = self._version >= (1, 21)
+        go_source.write(_GO_PINNED_BATCH_TYPE if pinned else _GO_BATCH_TYPE)
+        go_source.write(_GO_BATCH)
+        for fun in functions:
+            go_source.write(f'func (b *Batch) {fun["name"]}(')
+            go_source.write(', '.join(self._safe_key(arg['name']) + ' ' + self._typeAsGo(arg['type'])[0]
+                                      for arg in fun['args']))
+            go_source.write(') int {\n')
+            go_source.write(f'    args := (*C.{self._prefix}Batch_{fun["name"]})')
+            go_source.write(f'(b.add(C.{self._prefix}BATCH_{fun["name"]}))\n')
+            for arg in fun['args']:
+                name = self._safe_key(arg['name'])
+                if pinned and self._typeAsGo(arg['type'])[0].startswith(('*', 'unsafe.Pointer')):
+                    go_source.write(f'    if {name} != nil {{\n        b.pinner.Pin({name})\n    }}\n')
+                go_source.write(f'    args.{name} = {name}\n')
+            go_source.write('    return b.size - 1\n}\n\n')
+
+    def _build_buffers(self, info):
+        go_source = self._go_shards['buffers']
+        names = {fun['name'] for fun in info['functions']}
+        if self._generic:
+            go_source.write(_GO_GENERIC_BUFFERS)
+        if self._version >= (1, 20):
+            go_source.write(_GO_STRING_FUNCTIONS)
+        if self._version >= (1, 21):
+            go_source.write(_GO_PINNED)
+            if 'MPI_Wait' in names:
+                go_source.write(_GO_PINNED_WAIT)
+            if 'MPI_Test' in names:
+                go_source.write(_GO_PINNED_TEST)
+            if self._generic:
+                go_source.write(_GO_GENERIC_PINNED)
+        macros = {macro['name'] for macro in info['macros']}
+        if {'MPI_Alloc_mem', 'MPI_Free_mem'} <= names and 'MPI_INFO_NULL' in macros:
+            go_source.write(_GO_ALLOCATOR)
+            if self._generic:
+                go_source.write(_GO_GENERIC_ALLOCATOR)
+
+    def _build_slices(self, info):
+        go_source = self._go_shards['slices']
+        macros = {macro['name'] for macro in info['macros']}
+
+        self._declare(self._typeAsGo('MPI_Datatype')[1])
+        go_source.write(_GO_DATATYPE)
+        go_source.write('func datatypeOf(t reflect.Type) (datatype C_MPI_Datatype, ok bool) {\n')
+        go_source.write('    switch t.Kind() {\n')
+        for kinds, sizes in _GO_DATATYPES:
+            go_source.write('    case ' + ', '.join('reflect.' + kind for kind in kinds) + ':\n')
+            go_source.write('        switch t.Size() {\n')
+            for size, name in sizes.items():
+                if name in macros:
+                    go_source.write(f'        case {size}:\n            return {name}, true\n')
+            go_source.write('        }\n')
+        go_source.write('    }\n    return\n}\n\n')
+        if _GO_DERIVED_FUNCTIONS <= {fun['name'] for fun in info['functions']}:
+            go_source.write(_GO_DERIVED)
+        else:
+            go_source.write(_GO_NO_DERIVED)
+
+        for fun in sorted(info['functions'], key=lambda f: f['name']):
+            buffers = _slice_buffers(fun)
+            if not buffers:
+                continue
+            count = self._typeAsGo(fun['args'][buffers.stop]['type'])[0]
+            first = self._safe_key(fun['args'][buffers.start]['name'])
+            params = list()
+            for i, arg in enumerate(fun['args']):
+                if i in buffers:
+                    params.append(self._safe_key(arg['name']) + ' []T')
+                elif i not in (buffers.stop, buffers.stop + 1):
+                    params.append(self._safe_key(arg['name']) + ' ' + self._typeAsGo(arg['type'])[0])
+            values = list()
+            for i, arg in enumerate(fun['args']):
+                if i in buffers:
+                    values.append(f'PA(&{self._safe_key(arg["name"])})')
+                elif i == buffers.stop:
+                    values.append(f'{count}(len({first}))')
+                elif i == buffers.stop + 1:
+                    values.append('datatype')
+                else:
+                    values.append(self._safe_key(arg['name']))
+
+            go_source.write(f'func {fun["name"][len("MPI_"):]}Slice[T any](' + ', '.join(params) + ') error {\n')
+            root = any(arg['name'] == 'root' for arg in fun['args'])
+            for i in buffers[1:]:
+                other = self._safe_key(fun['args'][i]['name'])
+                go_source.write(f'    if len({other}) < len({first})' + (f' && len({other}) > 0' if root else '') +
+                                ' {\n        return ErrSliceLength\n    }\n')
+            go_source.write('    datatype, err := Datatype[T]()\n    if err != nil {\n        return err\n    }\n')
+            go_source.write(f'    return {fun["name"]}(' + ', '.join(values) + ')\n}\n\n')
+
     def build(self, info):
         go_source = self._go_source
+        folder = os.path.join(os.path.abspath(self._out), self._package)
+
+        if self._usage:
+            used = _go_usage(self._usage, self._package, folder)
+            info = select_blueprint(info, ['^(?:' + '|'.join(sorted(used)) + ')$'])
+            logging.info(f'Go sources in {self._usage} use {len(info["functions"])} functions and '
+                         f'{len(info["macros"])} macros')
 
         logging.info('Generating GO variables')
         self._build_macros(info)
@@ -150,9 +911,13 @@ class GoGenerator(BaseGenerator):
 
         logging.info('Generating GO functions')
         for fun in sorted(info['functions'], key=lambda f: f['name']):
-            go_source.write('func ' + fun['name'] + '(')
+            name = fun['name']
+            go_source = self._go_shards[_shard(name)]
+            go_source.write('func ' + name + '(')
             if 'vargs' in fun:
                 fun = self._vfun(fun)
+            if self._version >= _GO_ANNOTATIONS:
+                self._go_annotations[_shard(name)].write(_annotations(name, fun))
 
             i = 0
             for arg in fun['args']:
@@ -194,25 +959,76 @@ class GoGenerator(BaseGenerator):
             go_source.write(')\n')
             go_source.write('}\n\n')
 
+        batch = [fun for fun in sorted(info['functions'], key=lambda f: f['name']) if _batchable(fun)]
+        if self._batch and batch:
+            self._build_batch(batch)
+        elif self._batch:
+            logging.warning('No point-to-point functions to batch')
+
+        self._build_buffers(info)
+        if self._generic:
+            self._build_slices(info)
+        if self._progress:
+            macros = {macro['name'] for macro in info['macros']}
+            names = {fun['name'] for fun in info['functions']}
+            if {'MPI_Query_thread', 'MPI_Testsome'} <= names and {'MPI_UNDEFINED', 'MPI_ERR_IN_STATUS'} <= macros:
+                levels = [name for name in _GO_THREAD_LEVELS if name not in macros]
+                if levels:
+                    width = max(map(len, levels))
+                    self._go_shards['progress'].write('const (\n')
+                    for name in levels:
+                        self._go_shards['progress'].write(f'    {name.ljust(width)} C_int = C.{name}\n')
+                    self._go_shards['progress'].write(')\n\n')
+                self._go_shards['progress'].write(_GO_PROGRESS)
+            else:
+                logging.warning('MPI_Query_thread, MPI_Testsome, MPI_UNDEFINED or MPI_ERR_IN_STATUS not found, '
+                                'no progress engine')
+
+        go_source = self._go_source
         go_source.write(_GO_TYPES)
         go_source.write(_GO_FUNCTIONS)
         if self._generic:
             go_source.write(_GO_GENERIC_FUNCTIONS)
 
         logging.info('Generating Go binding sources')
-        folder = os.path.join(os.path.abspath(self._out), self._package)
         os.makedirs(folder, exist_ok=True)
-        with open(os.path.join(folder, 'mpi.go'), 'w') as go_file:
-            go_file.write(f'//{self._header_message(info)}\n')
-
-            go_file.write('package ' + self._package + '\n\n')
-            go_file.write('/*\n#cgo LDFLAGS: -lmpi\n')
-            go_file.write(self._c_source.getvalue())
-            go_file.write('*/\nimport "C"\n')
-            if self.unsafe:
-                go_file.write('import "unsafe"\n')
-            go_file.write('import "strings"\n')
-            go_file.write('import "strconv"\n\n')
-            go_file.write(self._go_types.getvalue())
-            go_file.write('\n\n')
-            go_file.write(go_source.getvalue())
+        header = f'//{self._header_message(info)}\n'
+        include = f'#include "{_GO_SHIM}.h"\n'
+        guard = self._prefix + _GO_SHIM.upper() + '_H'
+
+        self._output(os.path.join(folder, _GO_SHIM + '.h'),
+                     header,
+                     f'#ifndef {guard}\n#define {guard}\n\n',
+                     '#include <stddef.h>\n',
+                     '#include <stdlib.h>\n',
+                     '#include <string.h>\n',
+                     '#include <mpi.h>\n\n',
+                     self._c_header.getvalue(),
+                     '\n#endif\n')
+        self._output(os.path.join(folder, _GO_SHIM + '.c'), header, include, '\n', self._c_definitions.getvalue())
+        self._output(os.path.join(folder, 'mpi.go'),
+                     header,
+                     'package ' + self._package + '\n\n',
+                     '/*\n#cgo LDFLAGS: -lmpi\n',
+                     include,
+                     '*/\nimport "C"\n',
+                     'import "unsafe"\n',
+                     'import "strings"\n',
+                     'import "strconv"\n\n',
+                     self._go_types.getvalue(),
+                     '\n\n',
+                     go_source.getvalue())
+        for shard, source in self._go_shards.items():
+            source = source.getvalue()
+            if not source.strip():
+                self._discard(os.path.join(folder, f'mpi_{shard}.go'))
+                continue
+            annotations = self._go_annotations[shard].getvalue()
+            self._output(os.path.join(folder, f'mpi_{shard}.go'),
+                         header,
+                         'package ' + self._package + '\n\n',
+                         '/*\n' + annotations + include + '*/\nimport "C"\n' if re.search(r'\bC\.', source) else '',
+                         ''.join(f'import "{name}"\n' for name in _GO_IMPORTS if re.search(rf'\b{name}\.', source)),
+                         '\n',
+                         source)
+        return self.changed()
@@ -483,17 +483,11 @@ class JavaGenerator(BaseGenerator):
         header = f'//{self._header_message(info)}\n'
         path = os.path.join(self._out, self._package.replace('.', '/'))
         os.makedirs(path, exist_ok=True)
-        with open(os.path.join(path, f'{self._class_name}.java'), 'w') as class_file:
-            class_file.write(header)
-            class_file.write(j_types.getvalue())
-            class_file.write('\n\n')
-            class_file.write(j_source.getvalue())
+        self._output(os.path.join(path, f'{self._class_name}.java'),
+                     header, j_types.getvalue(), '\n\n', j_source.getvalue())
 
         lib_path = os.path.join(self._lib_out, self._lib_name)
         os.makedirs(lib_path, exist_ok=True)
-        with open(os.path.join(lib_path, self._lib_name + '.c'), 'w') as class_file:
-            class_file.write(header)
-            class_file.write(self._c_source.getvalue())
-
-        with open(os.path.join(lib_path, 'makefile'), 'w') as makefile:
-            makefile.write(_J_MAKEFILE_TEMPLATE.substitute(name=self._lib_name))
+        self._output(os.path.join(lib_path, self._lib_name + '.c'), header, self._c_source.getvalue())
+        self._output(os.path.join(lib_path, 'makefile'), _J_MAKEFILE_TEMPLATE.substitute(name=self._lib_name))
+        return self.changed()
@@ -3,10 +3,18 @@ import subprocess
 import tempfile
 import shutil
 import platform
+import hashlib
 import logging
 import re
+import time
+import itertools
+import threading
+import contextlib
+from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Union, Any
+from typing import List, Dict, Union, Any, Optional
+from mpi4all.cache import ProbeCache
+from mpi4all.profiler import Profile
 from mpi4all.version import __version__
 from functools import partial
 
@@ -18,8 +26,22 @@ def _find_compiler(*names: str) -> str:
     return names[0]
 
 
-def _run(cmd: str, *args: str, text: str = '', check: bool = True) -> subprocess.CompletedProcess:
-    return subprocess.run([cmd] + list(args), check=check, capture_output=True, text=True, input=text)
+def _run(cmd: str, *args: str, text: str = '', check: bool = True, profile: Optional[Profile] = None,
+         purpose: str = 'other', label: Optional[str] = None,
+         limit: Optional[threading.Semaphore] = None) -> subprocess.CompletedProcess:
+    with limit if limit is not None else contextlib.nullcontext():
+        start = time.perf_counter()
+        result = subprocess.run([cmd] + list(args), capture_output=True, text=True, input=text)
+    if profile is not None:
+        profile.call(purpose, time.perf_counter() - start, check and result.returncode != 0, label)
+    if check:
+        result.check_returncode()
+    return result
+
+
+def _label(names: List[str], n: int = 4) -> str:
+    label = ' '.join(names[:n])
+    return label + f' (+{len(names) - n})' if len(names) > n else label
 
 
 _CXX_TEMPLATE_NAME = """
@@ -41,155 +63,551 @@ _CXX_TEMPLATE_NAME = """
       }}
 """
 
+_CXX_TEMPLATE_BATCH = """
+      #include <mpi.h>
+      #include "cxxabi.h"
+      #include <iostream>
+
+      static void info(int i, const std::type_info &type, size_t bytes) {{
+          int status;
+          char *name = abi::__cxa_demangle(type.name(), 0, 0, &status);
+          if (status == 0) {{
+              std::cout << i << '\\t' << name << '\\t' << bytes << std::endl;
+              free(name);
+          }}
+      }}
+
+      int main(int argc, char *argv[]){{
+{probes}
+          return 0;
+      }}
+"""
+
+_CXX_PRELUDE = """\
+#include <mpi.h>
+#include "cxxabi.h"
+#include <iostream>
+"""
+
+_CXX_BATCH_LINE = _CXX_TEMPLATE_BATCH[:_CXX_TEMPLATE_BATCH.index('{probes}')].count('\n') + 1
+
+_BATCH_SIZE = 64
+
+_REQUIRED_MACROS = {'MPI_SUCCESS'}
+
+_MACRO_RE = re.compile(r'#define ([A-Za-z_]\w*)(?:\(([^)]*)\))?(.*)')
+
+_STDIN_LINE_RE = re.compile(r'<stdin>:(\d+):')
+
+
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_]\w*')
+
+_DECLARATION_TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{}();]')
+
+_TYPE_DECLARATION_RE = re.compile(r'(__extension__\s+)?(typedef|struct|union|enum)\b')
+
+_ATTRIBUTE_RE = re.compile(r'\b(__attribute__|__declspec|__asm__|asm)\s*\(')
+
+_SCOPE_RE = re.compile(r'extern\s*"C(\+\+)?"|(inline\s+)?namespace(\s+\w+)?')
+
+
+def _identity_flags(args: List[str]) -> List[str]:
+    flags = list()
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in ('-I', '-isystem', '-idirafter'):
+            skip = True
+        elif not arg.startswith(('-I', '-isystem', '-idirafter')):
+            flags.append(arg)
+    return flags
+
+
+def _split_declarations(code: str) -> List[str]:
+    code = '\n'.join(line for line in code.splitlines() if not line.startswith('#'))
+    declarations = list()
+    braces = list()
+    parens = 0
+    start = 0
+    for token in _DECLARATION_TOKEN_RE.finditer(code):
+        c = token.group()
+        i = token.start()
+        if c == '(':
+            parens += 1
+        elif c == ')':
+            parens -= 1
+        elif c == '{':
+            prefix = code[start:i].strip()
+            if (not braces or braces[-1] == 'link') and _SCOPE_RE.fullmatch(_strip_attributes(prefix).strip()):
+                braces.append('link')
+                start = i + 1
+            else:
+                braces.append('body' if prefix.endswith(')') else 'brace')
+        elif c == '}' and braces:
+            kind = braces.pop()
+            if kind == 'link':
+                start = i + 1
+            elif kind == 'body' and (not braces or braces[-1] == 'link'):
+                declarations.append(' '.join(code[start:i + 1].split()))
+                start = i + 1
+        elif c == ';' and parens == 0 and (not braces or braces[-1] == 'link'):
+            declarations.append(' '.join(code[start:i + 1].split()))
+            start = i + 1
+    return declarations
+
+
+def _strip_attributes(declaration: str) -> str:
+    match = _ATTRIBUTE_RE.search(declaration)
+    while match:
+        depth = 0
+        for end in range(match.end() - 1, len(declaration)):
+            if declaration[end] == '(':
+                depth += 1
+            elif declaration[end] == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        declaration = declaration[:match.start()] + declaration[end + 1:]
+        match = _ATTRIBUTE_RE.search(declaration, match.start())
+    return declaration
+
+
+def _declaration_name(declaration: str) -> Optional[str]:
+    declaration = _strip_attributes(declaration)
+    match = re.search(r'([A-Za-z_]\w*)\s*\(', declaration)
+    if match:
+        return match.group(1)
+    names = _IDENTIFIER_RE.findall(declaration.split('=')[0].split('[')[0])
+    return names[-1] if names else None
+
+
+def _split_params(params: str) -> List[str]:
+    values = list()
+    depth = 0
+    start = 0
+    for i, c in enumerate(params):
+        if c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            values.append(params[start:i].strip())
+            start = i + 1
+    values.append(params[start:].strip())
+    return values
+
+
+def _prototypes(code: str) -> Dict[str, List[str]]:
+    prototypes = dict()
+    for declaration in _split_declarations(code):
+        if '{' in declaration or _TYPE_DECLARATION_RE.match(declaration):
+            continue
+        declaration = _strip_attributes(declaration)
+        match = re.search(r'([A-Za-z_]\w*)\s*\(', declaration)
+        if match is None or match.group(1) in prototypes:
+            continue
+        depth = 0
+        for end in range(match.end() - 1, len(declaration)):
+            if declaration[end] == '(':
+                depth += 1
+            elif declaration[end] == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        prototypes[match.group(1)] = _split_params(declaration[match.end():end])
+    return prototypes
+
+
+class _Fragments:
+
+    def __init__(self, preprocessed: str):
+        self._macros = dict()
+        for line in preprocessed.splitlines():
+            if line.startswith('#define '):
+                self._macros[_IDENTIFIER_RE.match(line, 8).group()] = line
+        self._declarations = defaultdict(list)
+        types = list()
+        for declaration in _split_declarations(preprocessed):
+            if '{' in declaration or _TYPE_DECLARATION_RE.match(declaration):
+                name = None
+            else:
+                name = _declaration_name(declaration)
+            if name is None:
+                types.append(declaration)
+            else:
+                self._declarations[name].append(declaration)
+        self._types = ProbeCache.key(*types)
+
+    def key(self, expression: str) -> str:
+        pending = _IDENTIFIER_RE.findall(expression)
+        seen = set(pending)
+        parts = [self._types, expression]
+        while pending:
+            name = pending.pop()
+            parts.extend(self._declarations.get(name, ()))
+            if name in self._macros:
+                parts.append(self._macros[name])
+                for ref in _IDENTIFIER_RE.findall(self._macros[name]):
+                    if ref not in seen:
+                        seen.add(ref)
+                        pending.append(ref)
+        return ProbeCache.key(*parts[:2], *sorted(parts[2:]))
+
+
+class _TypeIndex:
+
+    def __init__(self, result: Dict[str, Any]):
+        self._types = result['types']
+        self._counter = itertools.count()
+        self._order = {tp: next(self._counter) for tp in self._types}
+        self._slots = list()
+        self._tokens = defaultdict(set)
+        self._type_tokens = defaultdict(set)
+        for m in result['macros']:
+            self._add_slot(m, 'type')
+        for f in result['functions']:
+            self._add_slot(f, 'rtype')
+            for arg in f['args']:
+                self._add_slot(arg, 'type')
+        for tp in self._types:
+            self._add_type(tp)
+
+    def _add_slot(self, obj: Dict[str, Any], key: str):
+        self._slots.append((obj, key))
+        self._index_slot(len(self._slots) - 1)
+
+    def _index_slot(self, i: int):
+        obj, key = self._slots[i]
+        for token in _IDENTIFIER_RE.findall(obj[key]):
+            self._tokens[token].add(i)
+
+    def _add_type(self, tp: str):
+        for token in _IDENTIFIER_RE.findall(tp + ' ' + self._types[tp]):
+            self._type_tokens[token].add(tp)
+
+    def _set_type(self, tp: str, val: str):
+        if tp not in self._types:
+            self._order[tp] = next(self._counter)
+        self._types[tp] = val
+        self._add_type(tp)
+
+    @staticmethod
+    def _find(index: Dict[str, set], val: str) -> set:
+        name = _IDENTIFIER_RE.search(val).group()
+        found = set()
+        for token, refs in index.items():
+            if token.endswith(name):
+                found.update(refs)
+        return found
+
+    def alias(self, tp: str, val: str):
+        types = self._types
+        del types[val]
+        self._set_type(tp, types['*'])
+
+        for i in self._find(self._tokens, val):
+            obj, key = self._slots[i]
+            if val in obj[key]:
+                obj[key] = obj[key].replace(val, tp)
+                self._index_slot(i)
+
+        affected = sorted((tp2 for tp2 in self._find(self._type_tokens, val) if tp2 in types), key=self._order.get)
+        snapshot = {tp2: types[tp2] for tp2 in affected}
+        for tp2 in affected:
+            val2 = snapshot[tp2]
+            if val in val2 and not val2.endswith('_t*'):
+                self._set_type(tp2, types[tp2].replace(val, tp))
+            if val in tp2 and not tp2.endswith('_t*'):
+                self._set_type(tp2.replace(val, tp), types[tp2])
+
+
+def _combine(patterns: List[str]) -> Optional[re.Pattern]:
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+
+def _chunks(items: List[Any], n: int) -> List[List[Any]]:
+    it = iter(items)
+    return list(iter(lambda: list(itertools.islice(it, n)), []))
+
 
 class Parser:
     CAST_RE = re.compile(r'^\(?\((MPI_\w+[ *]*)\)|OMPI_PREDEFINED_GLOBAL\([ ]*(MPI_\w+[ *]*)')
 
-    def __init__(self, cc: str, cxx: str, exclude_list: List[str]):
+    def __init__(self, cc: str, cxx: str, exclude_list: List[str], include_list: Optional[List[str]] = None,
+                 cache: Union[str, ProbeCache, None] = None, jobs: Optional[int] = None,
+                 limit: Optional[threading.Semaphore] = None):
         args_cc = cc.split() if cc is not None else [_find_compiler("mpicc", "mpiicc", "mpigcc")]
         args_cxx = cxx.split() if cxx is not None else [_find_compiler("mpicxx", "mpiicxx", "mpigxx", "mpic++")]
 
-        self._cc = partial(_run, *args_cc)
-        self._cxx = partial(_run, *args_cxx)
-        self._exclude_patterns = list(map(lambda e: re.compile(e), exclude_list))
+        self._args_cc = args_cc
+        self._args_cxx = args_cxx
+        self._profile = Profile()
+        self._limit = limit
+        self._cc = partial(_run, *args_cc, profile=self._profile, limit=limit)
+        self._cxx = partial(_run, *args_cxx, profile=self._profile, limit=limit)
+        self._exclude_list = list(exclude_list)
+        self._include_list = list(include_list) if include_list else None
+        self._exclude = _combine(self._exclude_list)
+        self._include = _combine(self._include_list)
+        self._cache = cache if isinstance(cache, ProbeCache) else ProbeCache(cache)
+        self._jobs = jobs if jobs else os.cpu_count() or 1
+        self._identity = ''
+        self._fragments = None
+        self._prelude = ['-fPIC', '-include', 'mpi.h']
         self._types = dict()
+        self._function_macros = list()
         self._info = dict()
 
     def _is_excluded(self, s: str):
-        for pattern in self._exclude_patterns:
-            if pattern.search(s):
-                return True
-        return False
-
-    def _c_info(self, name: str, wd: str) -> (str, bool, int, str):
+        return self._exclude is not None and self._exclude.search(s) is not None
+
+    def _is_included(self, s: str):
+        return self._include is None or self._include.search(s) is not None
+
+    def _build_prelude(self, wd: str):
+        prelude = os.path.join(wd, 'prelude.h')
+        with open(prelude, 'w') as file:
+            file.write(_CXX_PRELUDE)
+        if self._cxx('-fPIC', '-c', '-x', 'c++-header', '-o', prelude + '.gch', prelude, check=False,
+                     purpose='precompiled header').returncode != 0:
+            logging.info('Precompiled header not available')
+            if os.path.exists(prelude + '.gch'):
+                os.remove(prelude + '.gch')
+        self._prelude = ['-fPIC', '-include', prelude]
+
+    def _c_info(self, name: str, wd: str, purpose: str) -> (str, int, str):
         test_code = _CXX_TEMPLATE_NAME.format(name=name)
         test_bin = os.path.join(wd, name)
 
         try:
-            self._cxx('-fpermissive', '-x', 'c++', '-o', test_bin, '-', text=test_code)
-            typename, n_bytes = _run(test_bin).stdout.split('\n')[:2]
+            self._cxx(*self._prelude, '-fpermissive', '-x', 'c++', '-o', test_bin, '-', text=test_code,
+                      purpose=purpose, label=name)
+            typename, n_bytes = _run(test_bin, profile=self._profile, limit=self._limit, purpose=purpose + ' run',
+                                     label=name).stdout.split('\n')[:2]
             os.remove(test_bin)
 
-            if self._cxx('-shared', '-fPIC', '-include', 'mpi.h', '-o', '/dev/null', '-x', 'c++', '-',
-                         check=False, text=f'auto x = {name};').returncode == 0:
-                is_var = True
-            else:
-                is_var = False
+            return typename, n_bytes, None
+        except subprocess.CalledProcessError as ex:
+            return None, None, ex.stderr
+
+    def _c_info_batch(self, names: List[str], wd: str, purpose: str) -> Dict[str, tuple]:
+        probes = '\n'.join(f'          info({i}, typeid({name}), sizeof({name}));' for i, name in enumerate(names))
+        fd, test_bin = tempfile.mkstemp(dir=wd)
+        os.close(fd)
+
+        try:
+            self._cxx(*self._prelude, '-fpermissive', '-x', 'c++', '-o', test_bin, '-',
+                      text=_CXX_TEMPLATE_BATCH.format(probes=probes), purpose=purpose, label=_label(names))
+            output = _run(test_bin, profile=self._profile, limit=self._limit, purpose=purpose + ' run',
+                          label=_label(names)).stdout
+        finally:
+            os.remove(test_bin)
 
-            return typename, is_var, n_bytes, None
+        result = dict()
+        for line in output.splitlines():
+            i, typename, n_bytes = line.split('\t')
+            result[names[int(i)]] = typename, n_bytes, None
+        return result
+
+    def _c_var(self, name: str) -> bool:
+        return self._cxx(*self._prelude, '-shared', '-o', '/dev/null', '-x', 'c++', '-',
+                         check=False, text=f'auto x = {name};', purpose='var check', label=name).returncode == 0
+
+    def _c_var_batch(self, names: List[str]) -> Dict[str, bool]:
+        test_code = '\n'.join(f'auto x{i} = {name};' for i, name in enumerate(names))
+        self._cxx(*self._prelude, '-shared', '-o', '/dev/null', '-x', 'c++', '-', text=test_code,
+                  purpose='var check', label=_label(names))
+        return dict.fromkeys(names, True)
+
+    def _probe(self, names: List[str], batch, single, first_line: int) -> Dict[str, Any]:
+        if len(names) == 1:
+            return {names[0]: single(names[0])}
+        try:
+            result = batch(names)
         except subprocess.CalledProcessError as ex:
-            return None, None, None, ex.stderr
+            lines = {int(n) - first_line for n in _STDIN_LINE_RE.findall(ex.stderr or '')}
+            broken = [name for i, name in enumerate(names) if i in lines]
+            if 0 < len(broken) < len(names):
+                result = {name: single(name) for name in broken}
+                result.update(self._probe([name for name in names if name not in result], batch, single, first_line))
+            else:
+                half = len(names) // 2
+                result = self._probe(names[:half], batch, single, first_line)
+                result.update(self._probe(names[half:], batch, single, first_line))
+            return result
+
+        for name in names:
+            if name not in result:
+                result[name] = single(name)
+        return result
+
+    def _cached(self, kind: str, names: List[str], probe) -> Dict[str, Any]:
+        keys = {name: ProbeCache.key(self._identity, kind, self._fragments.key(name)) for name in names}
+        result = dict()
+        for name in names:
+            value = self._cache.get(keys[name])
+            if value is not None:
+                result[name] = value
+        self._profile.count('cache hits', len(result))
+        missing = list()
+        shared = dict()
+        for name in names:
+            if name not in result:
+                future = self._cache.claim(keys[name])
+                if future is None:
+                    missing.append(name)
+                else:
+                    shared[name] = future
+        self._profile.count('cache misses', len(missing))
+        self._profile.count('cache shared', len(shared))
+        try:
+            if missing:
+                for name, value in probe(missing).items():
+                    self._cache.put(keys[name], value)
+                    result[name] = value
+        finally:
+            for name in missing:
+                if name not in result:
+                    self._cache.release(keys[name])
+        for name, future in shared.items():
+            result[name] = future.result()
+            if result[name] is None:
+                result.update(self._cached(kind, [name], probe))
+        return result
+
+    def _probe_info(self, names: List[str], wd: str, purpose: str) -> Dict[str, tuple]:
+        info = self._cached('info', names, lambda missing: self._probe(
+            missing, lambda b: self._c_info_batch(b, wd, purpose), lambda n: self._c_info(n, wd, purpose),
+            _CXX_BATCH_LINE))
+        return {name: tuple(value) for name, value in info.items()}
+
+    def _probe_var(self, names: List[str]) -> Dict[str, bool]:
+        return self._cached('var', names, lambda missing: self._probe(missing, self._c_var_batch, self._c_var, 1))
+
+    def _probe_all(self, probe, names: List[str]) -> Dict[str, Any]:
+        result = dict()
+        if not names:
+            return result
+        with ThreadPoolExecutor(max_workers=self._jobs) as pool:
+            for batch in pool.map(probe, _chunks(names, min(_BATCH_SIZE, -(-len(names) // self._jobs)))):
+                result.update(batch)
+        return result
 
-    def _macro_filter(self, lines: List[str]) -> List[str]:
+    def _macro_filter(self, lines: List[str], info: Dict[str, str]) -> List[str]:
         filtered_lines = list()
         for line in lines:
             if not line.startswith('#define MPI_'):
                 if '_VERSION' in line:
                     name, value = line.split(' ', 2)[1:]
-                    if 'MPICH_VERSION' in line and self._info.get('vendor', 'unknown') == 'unknown':
-                        self._info['vendor'] = 'mpich'
-                        self._info['version'] = value.replace('"', '')
-                    elif 'OMPI_' in line and self._info.get('vendor', 'unknown') == 'unknown':
-                        self._info['vendor'] = 'ompi'
-                        if 'version' not in self._info:
-                            self._info['version'] = '..'
-                        if '_MAJOR_' in line:
-                            self._info['version'] = value + self._info['version']
-                        elif '_RELEASE_' in line:
-                            self._info['version'] += value
-                        elif '_MINOR_' in line:
-                            self._info['version'] = self._info['version'].replace('..', value)
+                    if 'MPICH_VERSION' in line and info.get('vendor', 'unknown') == 'unknown':
+                        info['vendor'] = 'mpich'
+                        info['version'] = value.replace('"', '')
+                    elif 'OMPI_' in line and info.get('vendor', 'unknown') in ('unknown', 'ompi'):
+                        if info.get('vendor') != 'ompi':
+                            info['vendor'] = 'ompi'
+                            info['version'] = '..'
+                        parts = info['version'].split('.')
+                        for i, part in enumerate(['OMPI_MAJOR_VERSION', 'OMPI_MINOR_VERSION', 'OMPI_RELEASE_VERSION']):
+                            if name == part:
+                                parts[i] = value
+                        info['version'] = '.'.join(parts)
                     elif 'I_MPI_VERSION' in line:
-                        self._info['vendor'] = 'impi'
-                        self._info['version'] = value.replace('"', '')
-                    elif 'vendor' not in self._info:
-                        self._info['vendor'] = 'unknown'
-                        self._info['version'] = ''
+                        info['vendor'] = 'impi'
+                        info['version'] = value.replace('"', '')
+                    elif 'vendor' not in info:
+                        info['vendor'] = 'unknown'
+                        info['version'] = ''
                     continue
             elif not self._is_excluded(line):
                 filtered_lines.append(line)
         return filtered_lines
 
-    def _parse_macro(self, line: str, wd: str) -> Union[Dict[str, str], None]:
-        macro = line.split(' ', 1)[1]
-        name = None
-        value = None
-        for i in range(len(macro)):
-            if macro[:-i].isidentifier():
-                name = macro[:-i]
-                value = macro[len(name):].strip()
-                break
-
-        if name is None:
+    def _parse_macro(self, line: str) -> Union[Dict[str, Any], None]:
+        match = _MACRO_RE.match(line)
+        if match is None:
             return None
 
-        r = {'raw': line, 'name': name, 'value': value}
-
-        typename, var, bytes, error = self._c_info(name, wd)
-        if error:
-            r["error"] = error
-            return r
-
-        r['type'] = typename
-        r['bytes'] = bytes
-        r['var'] = var
-        cast = Parser.CAST_RE.match(value)
-        if cast:
-            r['mtype'] = (cast.group(1) if cast.group(1) else cast.group(2)).strip()
-
+        name, params, value = match.groups()
+        r = {'raw': line, 'name': name}
+        if params is not None:
+            r['params'] = [param.strip() for param in params.split(',')] if params.strip() else []
+        r['value'] = value.strip()
         return r
 
-    def _parse_macros(self, wd: str) -> List[Dict[str, str]]:
+    def _reaches(self, macro: Dict[str, str], reached: Optional[set]) -> bool:
+        if reached is None or self._is_included(macro['name']) or macro['name'] in _REQUIRED_MACROS:
+            return True
+        if macro['name'] in reached:
+            return True
+        cast = Parser.CAST_RE.match(macro['value'])
+        return cast is not None and (cast.group(1) if cast.group(1) else cast.group(2)).strip(' *') in reached
+
+    def _parse_macros(self, wd: str, reached: Optional[set] = None) -> List[Dict[str, str]]:
         logging.info('Macros dumped')
-        macro_dump = self._cc('-dM', '-E', '-include', 'mpi.h', '-').stdout
+        macro_dump = self._cc('-dM', '-E', '-include', 'mpi.h', '-', purpose='macro dump').stdout
         logging.info('Parsing macros')
-        macro_lines = self._macro_filter(macro_dump.splitlines())
-        with ThreadPoolExecutor() as pool:
-            parsed_macros = pool.map(lambda l: self._parse_macro(l, wd), macro_lines)
+        macro_lines = self._macro_filter(macro_dump.splitlines(), self._info)
+        parsed_macros = list()
+        for m in map(self._parse_macro, macro_lines):
+            if m is None or not self._reaches(m, reached):
+                continue
+            if 'params' in m:
+                self._function_macros.append(m)
+            else:
+                parsed_macros.append(m)
+        info = self._probe_all(lambda names: self._probe_info(names, wd, 'macro type'),
+                               [m['name'] for m in parsed_macros])
+        var = self._probe_all(self._probe_var, [name for name, (_, _, error) in info.items() if not error])
         logging.info('Macros ready')
         filtered_macros = list()
 
         for m in parsed_macros:
-            if m is None:
+            typename, bytes, error = info[m['name']]
+            if error:
+                logging.warning(f'{m["raw"]} ignored: {error}')
                 continue
-            if "error" in m:
-                logging.warning(f'{m["raw"]} ignored: {m["error"]}')
-            else:
-                self._types[m['type']] = m['bytes']
-                if '*' in m['type']:
-                    self._types['*'] = m['bytes']
-                del m['bytes']
-                if 'mtype' in m:
-                    self._types[m['mtype']] = m['type']
-                    m['type'] = m['mtype']
-                    del m['mtype']
 
-                filtered_macros.append(m)
+            m['type'] = typename
+            m['var'] = var[m['name']]
+            self._types[typename] = bytes
+            if typename.endswith('*'):
+                self._types['*'] = bytes
+            cast = Parser.CAST_RE.match(m['value'])
+            if cast:
+                mtype = (cast.group(1) if cast.group(1) else cast.group(2)).strip()
+                self._types[mtype] = typename
+                m['type'] = mtype
+
+            filtered_macros.append(m)
 
         return filtered_macros
 
-    def _create_type(self, f: Dict[str, str], arg: str, wd: str):
+    def _create_type(self, f: Dict[str, str], arg: str, probed: Dict[str, tuple]):
         nc_arg = arg.replace('const', '').strip()
         if '*' in arg:
             self._types[arg] = self._types['*']
         elif nc_arg in self._types:
             self._types[arg] = self._types[nc_arg]
         else:
-            typename, _, bytes, error = self._c_info(arg, wd)
+            typename, bytes, error = probed[nc_arg]
             if error:
                 f['error'] = error
                 logging.error(f['name'] + error)
             self._types[arg] = typename
             self._types[typename] = bytes
 
-    def _parse_funcs(self, wd: str):
+    def _parse_headers(self, wd: str) -> List[Dict[str, Any]]:
         func_file = os.path.join(wd, 'func.X')
-        self._cc('-x', 'c', '-shared', '-o', '/dev/null', '-aux-info', func_file, '-include', 'mpi.h', '-')
+        self._cc('-x', 'c', '-shared', '-o', '/dev/null', '-aux-info', func_file, '-include', 'mpi.h', '-',
+                 purpose='aux-info')
 
         with open(func_file) as file:
             func_dump = file.readlines()
 
-        functions = list()
+        headers = list()
         for line in func_dump:
             f = {}
             try:
@@ -211,73 +629,80 @@ class Parser:
             fn, header = header.split('(', 1)
             f['name'] = fn.strip()
             header = header.strip()
-            if not f['name'].startswith('MPI_') or self._is_excluded(f['name']):
+            if not f['name'].startswith('MPI_') or self._is_excluded(f['name']) or not self._is_included(f['name']):
                 continue
 
             header = header[:-1].strip()
-            f['args'] = list()
-            for arg in header.split(','):
-                arg = arg.strip()
-                f['args'].append({'type': arg})
+            f['args'] = [{'type': arg.strip()} for arg in header.split(',')]
+            headers.append(f)
+
+        return headers
+
+    def _reached_types(self, headers: List[Dict[str, Any]]) -> Optional[set]:
+        if self._include is None:
+            return None
+        reached = set()
+        for f in headers:
+            for tp in [arg['type'] for arg in f['args']] + [f['rtype']]:
+                reached.update(_IDENTIFIER_RE.findall(tp))
+        return reached
+
+    def _param_decls(self) -> Dict[str, List[str]]:
+        return _prototypes(self._cc('-E', '-include', 'mpi.h', '-', purpose='prototypes').stdout)
+
+    def _parse_funcs(self, wd: str, headers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        unknown = dict()
+        for f in headers:
+            for tp in [arg['type'] for arg in f['args']] + [f['rtype']]:
+                nc_tp = tp.replace('const', '').strip()
+                if '*' not in tp and '...' not in tp and tp != 'void' and nc_tp not in self._types:
+                    unknown[nc_tp] = None
+        if '*' not in self._types:
+            unknown['void *'] = None
+        logging.info('Probing function types')
+        probed = self._probe_all(lambda names: self._probe_info(names, wd, 'function type'), list(unknown))
+        if '*' not in self._types:
+            self._types['*'] = probed['void *'][1]
+
+        functions = list()
+        for f in headers:
+            for arg in f['args']:
+                arg = arg['type']
                 if '...' in arg:
                     f['vargs'] = True
                 elif arg not in self._types:
                     if arg == 'void':
                         continue
-                    self._create_type(f, arg, wd)
+                    self._create_type(f, arg, probed)
 
-            self._create_type(f, f['rtype'], wd)
+            self._create_type(f, f['rtype'], probed)
             if len(f['args']) == 1 and f['args'][0]['type'] == 'void':
                 f['args'].clear()
 
             if 'error' not in f:
                 functions.append(f)
 
-        name_info = self._cc('-E', '-include', 'mpi.h', '-').stdout
+        prototypes = self._param_decls()
         for f in functions:
-            try:
-                if len(f['args']) == 0:
-                    continue
-                start = name_info.index(f['name'] + '(')
-                start += len(f['name']) + 1
-                end = name_info.index(';', start)
-                header = name_info[start:end - 1].strip()
-                values = header.split(',')
-                for i, v in enumerate(values):
-                    name = re.sub(r'[^a-zA-Z0-9_ ]', '', v).split(' ')[-1]
-                    if not name:
-                        name = 'x' + str(i)
-                    f['args'][i]['name'] = name
-            except Exception:
+            if len(f['args']) == 0:
+                continue
+            values = prototypes.get(f['name'], [])
+            if len(values) != len(f['args']):
                 logging.warning(f['name'] + ' param name not found')
-                for i in range(len(f['args'])):
-                    f['args'][i]['name'] = 'x' + str(i)
-
+                values = [''] * len(f['args'])
+            for i, v in enumerate(values):
+                name = re.sub(r'[^a-zA-Z0-9_ ]', '', v).split(' ')[-1]
+                if not name:
+                    name = 'x' + str(i)
+                f['args'][i]['name'] = name
 
         return functions
 
     def _type_fix(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        index = _TypeIndex(result)
         for tp, val in list(result['types'].items()):
             if tp.startswith('MPI') and val.endswith('_t*'):
-                del result['types'][val]
-                result['types'][tp] = result['types']['*']
-
-                for m in result['macros']:
-                    if val in m['type']:
-                        m['type'] = m['type'].replace(val, tp)
-
-                for f in result['functions']:
-                    if val in f['rtype']:
-                        f['rtype'] = f['rtype'].replace(val, tp)
-                    for arg in f['args']:
-                        if val in arg['type']:
-                            arg['type'] = arg['type'].replace(val, tp)
-
-                for tp2, val2 in list(result['types'].items()):
-                    if val in val2 and not val2.endswith('_t*'):
-                        result['types'][tp2] = result['types'][tp2].replace(val, tp)
-                    if val in tp2 and not tp2.endswith('_t*'):
-                        result['types'][tp2.replace(val, tp)] = result['types'][tp2]
+                index.alias(tp, val)
 
         for tp, val in result['types'].items():
             if '(' in tp and val == '1':
@@ -285,36 +710,102 @@ class Parser:
 
         return result
 
+    def profile(self) -> Dict[str, Any]:
+        report = self._profile.report()
+        report['jobs'] = self._jobs
+        return report
+
+    def fingerprint(self) -> Dict[str, str]:
+        result = self._cc('-dM', '-E', '-H', '-x', 'c', '-', text='#include <mpi.h>\n', purpose='fingerprint')
+        fingerprint = {
+            'cc': ' '.join([shutil.which(self._args_cc[0]) or self._args_cc[0]] + self._args_cc[1:]),
+            'cxx': ' '.join([shutil.which(self._args_cxx[0]) or self._args_cxx[0]] + self._args_cxx[1:]),
+            'compiler': '',
+            'header': '',
+        }
+        for line in result.stdout.splitlines():
+            if line.startswith('#define __VERSION__ '):
+                fingerprint['compiler'] = line.split(' ', 2)[2].replace('"', '')
+                break
+
+        headers = hashlib.sha256()
+        for line in result.stderr.splitlines():
+            level, _, path = line.partition(' ')
+            if not path or level.strip('.'):
+                continue
+            if level == '.' and not fingerprint['header'] and os.path.basename(path) == 'mpi.h':
+                fingerprint['header'] = os.path.abspath(path)
+            try:
+                with open(path, 'rb') as file:
+                    headers.update(file.read())
+            except OSError:
+                headers.update(path.encode())
+        fingerprint['hash'] = headers.hexdigest()
+
+        info = dict()
+        self._macro_filter(result.stdout.splitlines(), info)
+        fingerprint['vendor'] = info.get('vendor', 'unknown')
+        fingerprint['version'] = info.get('version', '')
+        fingerprint['exclude'] = self._exclude_list
+        if self._include_list is not None:
+            fingerprint['include'] = self._include_list
+        return fingerprint
+
     def parse(self) -> Dict[str, Any]:
         self._info["mpi4all"] = __version__
         self._info["system"] = platform.system()
         self._info["arch"] = platform.machine()
 
-        try:
-            logging.info('Checking C compiler')
-            self._cc('--version')
-            logging.info('C compiler OK')
-        except subprocess.CalledProcessError as ex:
-            raise RuntimeError(self._cc.args[0] + ' ERROR')
+        with self._profile.phase('checks'):
+            try:
+                logging.info('Checking C compiler')
+                cc_version = self._cc('--version', purpose='version').stdout
+                logging.info('C compiler OK')
+            except subprocess.CalledProcessError as ex:
+                raise RuntimeError(self._cc.args[0] + ' ERROR')
 
-        try:
-            logging.info('Checking C++ compiler')
-            self._cxx('--version')
-            logging.info('C++ compiler OK')
-        except subprocess.CalledProcessError as ex:
-            raise RuntimeError(self._cxx.args[0] + ' ERROR')
+            try:
+                logging.info('Checking C++ compiler')
+                cxx_version = self._cxx('--version', purpose='version').stdout
+                logging.info('C++ compiler OK')
+            except subprocess.CalledProcessError as ex:
+                raise RuntimeError(self._cxx.args[0] + ' ERROR')
 
-        try:
-            logging.info('Checking mpi.h header')
-            self._cc('-dM', '-E', '-include', 'mpi.h', '-')
-            logging.info('mpi.h OK')
-        except subprocess.CalledProcessError as ex:
-            raise RuntimeError('mpi.h NOT FOUND')
+            try:
+                logging.info('Checking mpi.h header')
+                self._cc('-dM', '-E', '-include', 'mpi.h', '-', purpose='header check')
+                logging.info('mpi.h OK')
+            except subprocess.CalledProcessError as ex:
+                raise RuntimeError('mpi.h NOT FOUND')
+
+        with self._profile.phase('fingerprint'):
+            self._info['fingerprint'] = self.fingerprint()
+        self._identity = ProbeCache.key(cc_version, cxx_version, *_identity_flags(self._args_cc[1:]), '',
+                                        *_identity_flags(self._args_cxx[1:]))
+        with self._profile.phase('fragments'):
+            self._fragments = _Fragments(self._cxx('-E', '-dD', '-x', 'c++', '-include', 'mpi.h', '-',
+                                                   purpose='fragments').stdout)
 
         with tempfile.TemporaryDirectory() as wd:
+            with self._profile.phase('prelude'):
+                self._build_prelude(wd)
+            with self._profile.phase('aux-info'):
+                headers = self._parse_headers(wd)
+            with self._profile.phase('macros'):
+                macros = self._parse_macros(wd, self._reached_types(headers))
+            with self._profile.phase('functions'):
+                functions = self._parse_funcs(wd, headers)
+
+        with self._profile.phase('type_fix'):
             return self._type_fix({
-                'macros': self._parse_macros(wd),
-                'functions': self._parse_funcs(wd),
+                'macros': macros,
+                'function_macros': self._function_macros,
+                'functions': functions,
                 'types': self._types,
                 'info': self._info
             })
+
+
+def parse_all(parsers: List[Parser]) -> List[Dict[str, Any]]:
+    with ThreadPoolExecutor(max_workers=len(parsers)) as pool:
+        return list(pool.map(Parser.parse, parsers))
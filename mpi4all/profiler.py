@@ -0,0 +1,58 @@
+import time
+import heapq
+import itertools
+import threading
+import contextlib
+from typing import Dict, Any, Optional
+
+
+class Profile:
+
+    def __init__(self, slowest: int = 20):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._phases: Dict[str, float] = dict()
+        self._calls: Dict[str, Dict[str, Any]] = dict()
+        self._counters: Dict[str, int] = dict()
+        self._slowest = list()
+        self._n_slowest = slowest
+        self._sequence = itertools.count()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases[name] = self._phases.get(name, 0) + time.perf_counter() - start
+
+    def call(self, purpose: str, seconds: float, failed: bool, label: Optional[str]):
+        with self._lock:
+            calls = self._calls.setdefault(purpose, {'count': 0, 'seconds': 0, 'failed': 0})
+            calls['count'] += 1
+            calls['seconds'] += seconds
+            if failed:
+                calls['failed'] += 1
+            entry = (seconds, next(self._sequence), purpose, label, failed)
+            if len(self._slowest) < self._n_slowest:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'seconds': time.perf_counter() - self._start,
+                'phases': dict(self._phases),
+                'calls': {purpose: dict(calls) for purpose, calls in sorted(self._calls.items())},
+                'processes': sum(calls['count'] for calls in self._calls.values()),
+                'failed': sum(calls['failed'] for calls in self._calls.values()),
+                'counters': dict(sorted(self._counters.items())),
+                'slowest': [{'purpose': purpose, 'seconds': seconds, 'probe': label, 'failed': failed}
+                            for seconds, _, purpose, label, failed in sorted(self._slowest, reverse=True)],
+            }
@@ -0,0 +1,104 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple, Mapping, Optional
+
+from mpi4all.blueprint import Blueprint, encode_blueprint
+from mpi4all.generator.go import GoGenerator
+from mpi4all.generator.java import JavaGenerator
+
+_GENERATORS = {
+    'go': GoGenerator,
+    'java': JavaGenerator,
+}
+
+_ALIASES = {
+    'jdk21': ('java', {'jdk21': True}),
+}
+
+_OPTIONS = {
+    'class': 'class_name',
+    'lib-name': 'lib_name',
+    'lib-out': 'lib_out',
+}
+
+_blueprint: Optional[Blueprint] = None
+
+
+class _Collector(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = list()
+
+    def emit(self, record: logging.LogRecord):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
+def parse_target(spec: str, defaults: Dict[str, Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    kind, _, options = spec.partition(':')
+    kind, extra = _ALIASES.get(kind, (kind, {}))
+    if kind not in _GENERATORS:
+        raise ValueError(f'unknown target {kind} in {spec}, expected one of ' + ', '.join(_GENERATORS))
+    kwargs = dict(defaults[kind], **extra)
+    for option in filter(None, options.split(',')):
+        key, sep, value = option.partition('=')
+        key = _OPTIONS.get(key.strip(), key.strip())
+        if key not in kwargs:
+            raise ValueError(f'unknown option {key} in {spec}, expected one of ' + ', '.join(kwargs))
+        if isinstance(kwargs[key], bool):
+            kwargs[key] = not sep or value.lower() in ('1', 'true', 'yes')
+        else:
+            kwargs[key] = value
+    if kwargs.get('lib_out', '') is None:
+        kwargs['lib_out'] = kwargs['out']
+    return kind, kwargs
+
+
+def _generate(info: Mapping, kind: str, kwargs: Dict[str, Any]) -> List[str]:
+    name = 'Go' if kind == 'go' else 'Java'
+    logging.info(f'Generating {name} bindings')
+    changed = _GENERATORS[kind](**kwargs).build(info)
+    logging.info(f'{name} bindings Ready')
+    return changed
+
+
+def _init_worker(data: bytes, level: int):
+    global _blueprint
+    _blueprint = Blueprint(data)
+    logging.getLogger().setLevel(level)
+
+
+def _worker(kind: str, kwargs: Dict[str, Any]) -> Tuple[List[logging.LogRecord], List[str], Optional[Exception]]:
+    root = logging.getLogger()
+    collector = _Collector()
+    root.handlers = [collector]
+    try:
+        changed = _generate(_blueprint, kind, kwargs)
+    except Exception as ex:
+        return collector.records, [], ex
+    return collector.records, changed, None
+
+
+def build_targets(info: Mapping, targets: List[Tuple[str, Dict[str, Any]]], jobs: int) -> List[str]:
+    changed = list()
+    if len(targets) < 2 or jobs < 2:
+        for kind, kwargs in targets:
+            changed.extend(_generate(info, kind, kwargs))
+        return changed
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(targets)), initializer=_init_worker,
+                             initargs=(encode_blueprint(info), logging.getLogger().getEffectiveLevel())) as pool:
+        futures = [pool.submit(_worker, kind, kwargs) for kind, kwargs in targets]
+        for future in futures:
+            records, outputs, error = future.result()
+            for record in records:
+                logging.getLogger(record.name).handle(record)
+            if error is not None:
+                raise error
+            changed.extend(outputs)
+    return changed
@@ -1,3 +1,3 @@
 module mpitest
 
-go 1.18
+go 1.21
@@ -21,6 +21,31 @@ func main() {
 		}
 	}
 
+	var rank mpi.C_int
+	if err := mpi.MPI_Comm_rank(mpi.MPI_COMM_WORLD, &rank); err != nil {
+		panic(err)
+	}
+
+	var pinned mpi.Pinned
+	var request mpi.C_MPI_Request
+	received := make([]mpi.C_int, len(array))
+	if err := mpi.MPI_Irecv(mpi.PinPA(&pinned, &received), mpi.C_int(len(received)), mpi.MPI_INT, rank, 0,
+		mpi.MPI_COMM_WORLD, &request); err != nil {
+		panic(err)
+	}
+	if err := mpi.MPI_Send(mpi.PA(&array), mpi.C_int(len(array)), mpi.MPI_INT, rank, 0, mpi.MPI_COMM_WORLD); err != nil {
+		panic(err)
+	}
+	if err := pinned.Wait(&request, mpi.MPI_STATUS_IGNORE); err != nil {
+		panic(err)
+	}
+
+	for i := 0; i < len(array); i++ {
+		if array[i] != received[i] {
+			panic("Irecv error")
+		}
+	}
+
 	if err := mpi.MPI_Finalize(); err != nil {
 		panic(err)
 	}
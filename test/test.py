@@ -60,9 +60,16 @@ def parser(path):
          '--cxx', 'g++ -I /mpi/include', '--dump', '/mpi/f.json'])
 
 
+def parser_include(path):
+    cmd(['docker', 'run', '--rm', '-v', path + ':/mpi', 'mpi4all',
+         '--cc', 'gcc -I /mpi/include',
+         '--cxx', 'g++ -I /mpi/include', '--include', '^MPI_Init$', '^MPI_Wtime$', '^MPI_Finalize$',
+         '--dump', '/mpi/include.json', '--go', '--out', '/mpi/include'])
+
+
 def go_generator(path):
     cmd(['docker', 'run', '--rm', '-v', path + ':/mpi', 'mpi4all', '--load', '/mpi/f.json', '--out', '/mpi/go',
-         '--go'])
+         '--go', '--go-version', '1.21'])
 
 
 def go_test(path):
@@ -93,6 +100,7 @@ def java_test(path):
 
 def common_tests(name, path):
     test(name + ' parser', lambda: parser(path))
+    test(name + ' allowlisted parser', lambda: parser_include(path))
     test(name + ' go generator', lambda: go_generator(path))
     test(name + ' go build and test', lambda: go_test(path))
     test(name + ' java21 generator', lambda: java21_generator(path))